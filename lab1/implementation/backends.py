@@ -0,0 +1,247 @@
+import importlib.util
+import threading
+import time
+import warnings
+
+import numpy as np
+
+BACKENDS = ("numpy", "scipy", "opencv")
+
+# Наибольший размер кадра для микробенчмарка автоматического выбора
+BENCHMARK_MAX_PIXELS = 1 << 20
+# Наибольший радиус окружностей в микробенчмарке: время поиска растёт с диапазоном радиусов
+BENCHMARK_MAX_RADIUS = 32
+
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+class BackendRegistry:
+    """
+    Реестр взаимозаменяемых реализаций операций ImageProcessing.
+
+    Каждая операция (edges, corners, circles) может иметь реализации на чистом NumPy,
+    SciPy и OpenCV с одинаковой сигнатурой function(processor, image, **params).
+    В режиме "auto" бэкенд выбирается микробенчмарком отдельно для каждой операции
+    и размера кадра (степень двойки числа пикселей), результат запоминается.
+    Недоступный бэкенд (например, без установленного OpenCV) заменяется доступным.
+    """
+
+    def __init__(self):
+        self._implementations = {}
+        self._requirements = {}
+        self._choices = {}
+        self._lock = threading.Lock()
+
+    def register(self, operation: str, backend: str, requires: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+        def decorator(function):
+            self._implementations.setdefault(operation, {})[backend] = function
+            self._requirements[backend] = requires
+            return function
+
+        return decorator
+
+    def is_available(self, backend: str) -> bool:
+        requires = self._requirements.get(backend)
+        return requires is None or _has_module(requires)
+
+    def available(self, operation: str) -> list:
+        if operation not in self._implementations:
+            raise ValueError(f"Unknown operation {operation!r}")
+        return [
+            backend
+            for backend in BACKENDS
+            if backend in self._implementations[operation] and self.is_available(backend)
+        ]
+
+    @staticmethod
+    def size_bucket(image: np.ndarray) -> int:
+        return int(image.shape[0] * image.shape[1]).bit_length()
+
+    def resolve(
+        self, operation: str, backend: str, processor, image: np.ndarray, params: dict = None
+    ) -> str:
+        candidates = self.available(operation)
+        if backend != "auto":
+            if backend in candidates:
+                return backend
+            warnings.warn(
+                f"Backend {backend!r} is not available for {operation!r}, "
+                f"falling back to {candidates[0]!r}",
+                RuntimeWarning,
+                stacklevel=3,
+            )
+            return candidates[0]
+
+        key = (operation, self.size_bucket(image))
+        with self._lock:
+            choice = self._choices.get(key)
+        if choice is None:
+            choice = self.benchmark(operation, processor, key[1], candidates, params or {})
+            with self._lock:
+                self._choices[key] = choice
+        return choice
+
+    def benchmark(
+        self, operation: str, processor, bucket: int, candidates: list, params: dict = None
+    ) -> str:
+        """
+        Измеряет каждую реализацию с параметрами вызова params на синтетической сцене
+        размера bucket и возвращает быстрейшую.
+
+        Сцена - однотонный фон с кругами и прямоугольником, а не шум: на шуме поиск
+        окружностей находит тысячи кандидатов и работает на порядки дольше, чем на
+        реальных кадрах. По той же причине max_radius окружностей ограничивается
+        BENCHMARK_MAX_RADIUS.
+        """
+        if len(candidates) == 1:
+            return candidates[0]
+        pixels = min(1 << max(bucket - 1, 0), BENCHMARK_MAX_PIXELS)
+        side = max(int(np.sqrt(pixels)), 8)
+        sample = _benchmark_scene(side)
+        params = dict(params or {})
+        if operation == "circles":
+            max_radius = min(params.get("max_radius") or BENCHMARK_MAX_RADIUS, BENCHMARK_MAX_RADIUS)
+            params["max_radius"] = max(max_radius, params.get("min_radius", 5))
+
+        timings = {}
+        for backend in candidates:
+            function = self._implementations[operation][backend]
+            function(processor, sample, **params)
+            start = time.perf_counter()
+            function(processor, sample, **params)
+            timings[backend] = time.perf_counter() - start
+        return min(timings, key=timings.get)
+
+    def choices(self) -> dict:
+        with self._lock:
+            return dict(self._choices)
+
+    def run(self, operation: str, backend: str, processor, image: np.ndarray, **params):
+        backend = self.resolve(operation, backend, processor, image, params)
+        return self._implementations[operation][backend](processor, image, **params)
+
+
+registry = BackendRegistry()
+
+
+def _benchmark_scene(side: int) -> np.ndarray:
+    yy, xx = np.mgrid[:side, :side]
+    scene = np.full((side, side, 3), 40, dtype=np.uint8)
+    radius = max(min(side // 8, BENCHMARK_MAX_RADIUS), 2)
+    for cx, cy in ((side // 4, side // 4), (side * 3 // 4, side // 2)):
+        scene[(xx - cx) ** 2 + (yy - cy) ** 2 <= radius**2] = 200
+    scene[side // 2 : side * 7 // 8, side // 8 : side // 2] = 120
+    return scene
+
+
+def _normalize(magnitude: np.ndarray, dtype) -> np.ndarray:
+    return (magnitude * 255 / magnitude.max()).astype(dtype)
+
+
+@registry.register("edges", "numpy")
+def _edges_numpy(processor, image):
+    return processor.edge_detection(image)
+
+
+@registry.register("edges", "scipy")
+def _edges_scipy(processor, image):
+    from scipy import ndimage
+
+    gray = processor._rgb_to_grayscale(image)
+    grad_x = ndimage.sobel(gray, axis=1, mode="constant")
+    grad_y = ndimage.sobel(gray, axis=0, mode="constant")
+    return _normalize(np.hypot(grad_x, grad_y), processor._image_data_type)
+
+
+@registry.register("edges", "opencv", requires="cv2")
+def _edges_opencv(processor, image):
+    import cv2
+
+    gray = processor._rgb_to_grayscale(image).astype(np.float32)
+    grad_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3, borderType=cv2.BORDER_CONSTANT)
+    grad_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3, borderType=cv2.BORDER_CONSTANT)
+    return _normalize(cv2.magnitude(grad_x, grad_y), processor._image_data_type)
+
+
+@registry.register("corners", "scipy")
+def _corners_scipy(processor, image, k: float = 0.04, threshold: float = 0.01):
+    return processor.corner_detection(image, k=k, threshold=threshold)
+
+
+@registry.register("corners", "opencv", requires="cv2")
+def _corners_opencv(processor, image, k: float = 0.04, threshold: float = 0.01):
+    import cv2
+
+    # те же шаги, что в corner_detection: Собель, гауссов фильтр sigma=1 (радиус 4), максимум 3x3
+    border = cv2.BORDER_REFLECT
+    gray = processor._rgb_to_grayscale(image).astype(np.float64)
+    Ix = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3, borderType=border)
+    Iy = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3, borderType=border)
+
+    Ixx = cv2.GaussianBlur(Ix * Ix, (9, 9), 1, borderType=border)
+    Ixy = cv2.GaussianBlur(Ix * Iy, (9, 9), 1, borderType=border)
+    Iyy = cv2.GaussianBlur(Iy * Iy, (9, 9), 1, borderType=border)
+
+    R = Ixx * Iyy - Ixy**2 - k * (Ixx + Iyy) ** 2
+    local_max = cv2.dilate(R, np.ones((3, 3), np.uint8), borderType=border) == R
+
+    result = image.copy()
+    result[local_max & (R > threshold * R.max())] = [255, 0, 0]
+    return result
+
+
+@registry.register("circles", "numpy")
+def _circles_numpy(processor, image, **params):
+    return processor.detect_circles(image, **params)
+
+
+@registry.register("circles", "opencv", requires="cv2")
+def _circles_opencv(
+    processor,
+    image,
+    min_radius: int = 5,
+    max_radius: int = None,
+    dp: int = 1,
+    min_dist: float = None,
+    edge_threshold: float = 0.25,
+    min_score: float = 0.5,
+    max_circles: int = 50,
+    blur_sigma: float = 1.5,
+):
+    import cv2
+
+    gray = processor._rgb_to_grayscale(image).clip(0, 255).astype(np.uint8)
+    if blur_sigma:
+        gray = cv2.GaussianBlur(gray, (0, 0), blur_sigma)
+    # пороги detect_circles в единицах OpenCV: верхний порог Canny (L1-норма градиента)
+    # и число голосов аккумулятора, пропорциональное длине наименьшей окружности
+    grad_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    grad_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    magnitude = np.abs(grad_x) + np.abs(grad_y)
+    max_radius = max_radius or min(image.shape[:2]) // 2
+    min_dist = min_dist or min_radius
+    found = cv2.HoughCircles(
+        gray,
+        cv2.HOUGH_GRADIENT,
+        dp=dp,
+        minDist=min_dist,
+        param1=max(float(edge_threshold * magnitude.max()), 1.0),
+        param2=max(int(min_score * 2 * np.pi * min_radius), 1),
+        minRadius=min_radius,
+        maxRadius=max_radius,
+    )
+    if found is None:
+        return np.empty((0, 4), dtype=np.float64)
+
+    # OpenCV не оценивает окружности и оставляет почти совпадающие, поэтому его центры
+    # (упорядоченные по голосам) отбираются так же, как кандидаты detect_circles
+    points = processor._circle_edges(image, edge_threshold, blur_sigma)
+    candidates = np.rint(found[0][:max_circles, :2]).astype(np.intp)
+    return processor._select_circles(
+        points, candidates, min_radius, max_radius, min_dist, min_score, max_circles, dp + 2
+    )
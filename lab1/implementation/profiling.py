@@ -0,0 +1,290 @@
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from multiprocessing import util
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# До Python 3.12 cProfile профилирует только включивший его поток, и в каждом потоке может
+# работать свой профилировщик; с 3.12 (sys.monitoring) один включённый профилировщик
+# видит все потоки, а второй не включается
+THREAD_PROFILES = sys.version_info < (3, 12)
+
+# Профилировщик текущего процесса, см. Profiler.start и stage
+_active = None
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в килобайтах в Linux и в байтах в macOS
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """
+    Профилировщик одного процесса: cProfile или выборка стеков всех потоков.
+
+    Время делится на стадии (stage) отдельно в каждом потоке. В режиме cprofile у каждой
+    стадии каждого потока свой cProfile.Profile, при записи профили потоков одной стадии
+    объединяются. В Python 3.12+ свой профилировщик есть только у потока, запустившего
+    профилировщик: он видит и остальные потоки, но их вызовы попадают в его текущую стадию
+    (см. thread_stages_profiled). В режиме sample к стекам потока добавляется
+    имя его текущей стадии. dump() пишет в output_dir
+    файлы <name>-<pid>-<stage>.pstats или <name>-<pid>.collapsed и <name>-<pid>.json
+    с длительностями стадий, пиковым RSS и, при trace_memory, пиком tracemalloc.
+    """
+
+    def __init__(
+        self,
+        output_dir,
+        mode: str = "cprofile",
+        name: str = "main",
+        interval: float = 0.005,
+        trace_memory: bool = False,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.name = name
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.stage_seconds = Counter()
+        self._profiles = {}
+        self._stages = {}
+        self._samples = Counter()
+        self._sampler = None
+        self._owner = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def worker_config(self) -> tuple:
+        """Аргументы start_worker_profiler для рабочих процессов пула."""
+        return str(self.output_dir), self.mode, self.interval, self.trace_memory
+
+    def start(self, stage: str = "main") -> "Profiler":
+        global _active
+        _active = self
+        self._owner = threading.get_ident()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self._sampler.start()
+        self._enter(stage)
+        return self
+
+    def stop(self):
+        global _active
+        self._leave()
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if _active is self:
+            _active = None
+
+    def _enter(self, stage: str):
+        thread_id = threading.get_ident()
+        with self._lock:
+            previous = self._stages.get(thread_id)
+            self._stages[thread_id] = (stage, time.perf_counter(), previous)
+        if self._profiles_thread(thread_id):
+            if previous is not None:
+                self._profiles[thread_id, previous[0]].disable()
+            with self._lock:
+                profile = self._profiles.setdefault((thread_id, stage), cProfile.Profile())
+            profile.enable()
+
+    def _leave(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            stage, started, previous = self._stages.pop(thread_id)
+            self.stage_seconds[stage] += time.perf_counter() - started
+            if previous is not None:
+                self._stages[thread_id] = previous
+        if self._profiles_thread(thread_id):
+            self._profiles[thread_id, stage].disable()
+            if previous is not None:
+                self._profiles[thread_id, previous[0]].enable()
+
+    def _profiles_thread(self, thread_id: int) -> bool:
+        return self.mode == "cprofile" and (THREAD_PROFILES or thread_id == self._owner)
+
+    @contextmanager
+    def stage(self, name: str):
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._leave()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                stages = {thread_id: entry[0] for thread_id, entry in self._stages.items()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                prefix = [f"{self.name}-{os.getpid()}", names.get(thread_id, str(thread_id))]
+                if thread_id in stages:
+                    prefix.append(f"stage:{stages[thread_id]}")
+                self._samples[";".join(prefix + stack[::-1])] += 1
+
+    def dump(self):
+        base = self.output_dir / f"{self.name}-{os.getpid()}"
+        if self.mode == "cprofile":
+            stages = {}
+            for (_, stage), profile in self._profiles.items():
+                stages.setdefault(stage, []).append(profile)
+            for stage, profiles in stages.items():
+                pstats.Stats(*profiles).dump_stats(f"{base}-{stage}.pstats")
+        else:
+            with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write(f"{stack} {count}\n")
+
+        memory = {
+            "name": self.name,
+            "pid": os.getpid(),
+            "peak_rss_kb": _peak_rss_kb(),
+            "tracemalloc_peak_bytes": (
+                tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+            ),
+            "stage_seconds": dict(self.stage_seconds),
+        }
+        Path(f"{base}.json").write_text(json.dumps(memory, indent=2), encoding="utf-8")
+
+    def finish(self):
+        self.stop()
+        self.dump()
+
+
+def stage(name: str):
+    """Стадия активного профилировщика процесса; без профилирования - пустой контекст."""
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def thread_stages_profiled() -> bool:
+    """
+    False, если cProfile не может разделить по стадиям вызовы в потоках пулов
+    (профилирование cprofile в Python 3.12+); без профилирования - True.
+    """
+    return _active is None or _active.mode != "cprofile" or THREAD_PROFILES
+
+
+def worker_config() -> Optional[tuple]:
+    """Настройки для рабочих процессов пула; None, если профилирование выключено."""
+    return _active.worker_config if _active is not None else None
+
+
+def start_worker_profiler(config: Optional[tuple]):
+    """
+    Вызывается в инициализаторе рабочего процесса. Профиль пишется при штатном
+    завершении процесса (multiprocessing.util.Finalize), то есть после shutdown пула.
+    """
+    global _active
+    inherited, _active = _active, None
+    if inherited is not None:
+        # рабочий процесс, запущенный через fork, наследует включённый cProfile родителя;
+        # в Python 3.12+ второй профилировщик при этом не включается
+        for profile in inherited._profiles.values():
+            profile.disable()
+    if config is None:
+        return
+    output_dir, mode, interval, trace_memory = config
+    profiler = Profiler(
+        output_dir, mode, name="worker", interval=interval, trace_memory=trace_memory
+    )
+    profiler.start("worker")
+    util.Finalize(profiler, profiler.finish, exitpriority=100)
+
+
+@contextmanager
+def session(
+    mode: Optional[str],
+    output_prefix="profile",
+    interval: float = 0.005,
+    trace_memory: bool = False,
+):
+    """
+    Профилирует тело блока и рабочие процессы пулов, созданных внутри него.
+
+    Профили отдельных процессов и стадий пишутся во временный каталог <output_prefix>.parts,
+    по выходе из блока объединяются merge_profiles, и каталог удаляется.
+    Пулы процессов должны быть остановлены до выхода из блока - иначе их рабочие
+    процессы не успеют записать свои профили. При mode=None ничего не делает.
+    """
+    if mode is None:
+        yield None
+        return
+    parts_dir = Path(f"{output_prefix}.parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    profiler = Profiler(parts_dir, mode, interval=interval, trace_memory=trace_memory).start()
+    try:
+        yield profiler
+    finally:
+        profiler.finish()
+        merge_profiles(parts_dir, output_prefix)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+def merge_profiles(output_dir, output_prefix) -> dict:
+    """
+    Объединяет профили всех процессов из output_dir в <output_prefix>.pstats
+    (и по стадиям - в <output_prefix>.<стадия>.pstats) и/или <output_prefix>.collapsed
+    (для flamegraph.pl / speedscope, стадия - часть стека), а сведения о памяти
+    и стадиях - в <output_prefix>.memory.json. Возвращает эти сведения.
+    """
+    output_dir = Path(output_dir)
+    pstats_files = sorted(output_dir.glob("*.pstats"))
+    if pstats_files:
+        pstats.Stats(*map(str, pstats_files)).dump_stats(f"{output_prefix}.pstats")
+        stages = {}
+        for path in pstats_files:
+            # <name>-<pid>-<stage>.pstats
+            stages.setdefault(path.stem.split("-", 2)[2], []).append(str(path))
+        for stage, paths in stages.items():
+            pstats.Stats(*paths).dump_stats(f"{output_prefix}.{stage}.pstats")
+
+    collapsed_files = sorted(output_dir.glob("*.collapsed"))
+    if collapsed_files:
+        with open(f"{output_prefix}.collapsed", "w", encoding="utf-8") as out:
+            for path in collapsed_files:
+                out.write(path.read_text(encoding="utf-8"))
+
+    processes = [
+        json.loads(path.read_text(encoding="utf-8")) for path in sorted(output_dir.glob("*.json"))
+    ]
+    Path(f"{output_prefix}.memory.json").write_text(
+        json.dumps(processes, indent=2), encoding="utf-8"
+    )
+    return {"processes": processes}
@@ -14,23 +14,252 @@ main.py
 
 Аргументы:
     метод: edges | corners | circles
-    путь_к_изображению: путь к входному изображению
-    -o, --output: путь для сохранения результата (по умолчанию: <имя_входного_файла>_result.png)
+    путь_к_изображению: путь к входному изображению (.npy и .raw открываются через np.memmap)
+    -o, --output: путь для сохранения результата (по умолчанию: <имя_входного_файла>_result.png,
+        для .npy/.raw - <имя_входного_файла>_result.npy)
+    --shape, --dtype: форма и тип данных для входа .raw
+    --tile-size: сторона плитки при обработке, --threads: число потоков для плиток
+    --backend: реализация метода - numpy (по умолчанию, по плиткам), scipy, opencv
+        или auto (выбор микробенчмарком); кроме numpy кадр обрабатывается целиком
+
+Изображения обрабатываются по плиткам, а результат в .npy/.raw пишется в файл,
+отображённый в память, поэтому резидентная память не растёт с размером изображения.
 
 Пример:
     python main.py edges input.jpg
     python main.py corners input.jpg -o corners_result.png
+    python main.py edges frame.raw --shape 20000 30000 3 -o edges.npy
+    python main.py circles input.jpg --backend opencv
+
+Пакетный режим: если путь - каталог или шаблон glob, обрабатываются все изображения,
+-o задаёт каталог результатов (допускается подстановка {method}), --jobs - число
+рабочих процессов. Входы с актуальным результатом пропускаются (--force - обработать заново).
+    python main.py edges photos/ -o results/{method} --jobs 8
+    python main.py corners "photos/*.jpg" --jobs 4
+
+Профилирование: --profile [cprofile|sample] профилирует основной и рабочие процессы
+по стадиям (load, process, save), профили объединяются в <префикс>.pstats
+(по стадиям - <префикс>.<стадия>.pstats) или <префикс>.collapsed
+(для flamegraph.pl / speedscope), пиковая память процессов
+пишется в <префикс>.memory.json; префикс задаёт --profile-output.
+    python main.py edges photos/ --jobs 4 --profile --profile-output edges_profile
 
 Автор: [Ваше имя]
 """
 
 import argparse
+import glob
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import cv2
+import numpy as np
 
+from implementation import profiling
+from implementation.backends import BACKENDS
 from implementation.image_processing import ImageProcessing
 
+MEMMAP_EXTENSIONS = (".npy", ".raw")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp") + MEMMAP_EXTENSIONS
+
+# Обработчик рабочего процесса пакетного режима, создаётся инициализатором пула
+_worker_processor = None
+
+
+def load_image(path: str, shape=None, dtype: str = "uint8"):
+    """
+    Загружает изображение; .npy и .raw открываются через np.memmap без чтения в память.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext == ".raw":
+        if shape is None:
+            raise ValueError("для входа .raw нужно указать --shape")
+        return np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+    return cv2.imread(path)
+
+
+def open_output(path: str, shape: tuple, dtype):
+    """
+    Создаёт отображённый в память файл результата для .npy/.raw, иначе возвращает None.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    if ext == ".raw":
+        return np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+    return None
+
+
+def process_image(
+    processor: ImageProcessing,
+    method: str,
+    image: np.ndarray,
+    output_path: str,
+    tile_size: int = 1024,
+    threads: int = 1,
+) -> None:
+    """
+    Применяет метод и сохраняет результат в output_path.
+
+    Бэкенд numpy обрабатывает изображение по плиткам, остальные бэкенды реестра
+    (см. ImageProcessing.apply) - целиком.
+    """
+    with profiling.stage("process"):
+        if method not in ("edges", "corners", "circles"):
+            raise ValueError(f"неизвестный метод {method}")
+        if processor._backend != "numpy":
+            shape, dtype = image.shape, image.dtype
+            if method == "edges":
+                shape, dtype = image.shape[:2], processor._image_data_type
+            out = open_output(output_path, shape, dtype)
+            result = processor.apply(method, image)
+            if method == "circles":
+                result = processor.draw_circles(image, result)
+            if out is not None:
+                out[...] = result
+        elif method == "edges":
+            out = open_output(output_path, image.shape[:2], processor._image_data_type)
+            result = processor.edge_detection_tiled(
+                image, tile_size=tile_size, workers=threads, out=out
+            )
+        elif method == "corners":
+            out = open_output(output_path, image.shape, image.dtype)
+            result = processor.corner_detection_tiled(
+                image, tile_size=tile_size, workers=threads, out=out
+            )
+        elif method == "circles":
+            out = open_output(output_path, image.shape, image.dtype)
+            result = processor.circle_detection(image)
+            if out is not None:
+                out[...] = result
+
+    with profiling.stage("save"):
+        if out is not None:
+            out.flush()
+        else:
+            cv2.imwrite(output_path, result)
+
+
+def default_output_path(input_path: str, output_dir: str = None) -> str:
+    base, ext = os.path.splitext(input_path)
+    ext = ".npy" if ext.lower() in MEMMAP_EXTENSIONS else ".png"
+    if output_dir is not None:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return f"{base}_result{ext}"
+
+
+def is_batch_input(path: str) -> bool:
+    return os.path.isdir(path) or any(char in path for char in "*?[")
+
+
+def collect_inputs(path: str) -> list:
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in os.listdir(path)]
+    else:
+        paths = glob.glob(path)
+    return sorted(
+        p
+        for p in paths
+        if os.path.isfile(p)
+        and os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS
+        and not os.path.splitext(p)[0].endswith("_result")
+    )
+
+
+def is_up_to_date(input_path: str, output_path: str) -> bool:
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(
+        input_path
+    )
+
+
+def _init_worker(profile=None, backend: str = "numpy") -> None:
+    global _worker_processor
+    profiling.start_worker_profiler(profile)
+    _worker_processor = ImageProcessing(backend=backend)
+
+
+def _process_file(
+    method: str,
+    input_path: str,
+    output_path: str,
+    shape=None,
+    dtype: str = "uint8",
+    tile_size: int = 1024,
+    threads: int = 1,
+) -> int:
+    with profiling.stage("load"):
+        image = load_image(input_path, shape=shape, dtype=dtype)
+    if image is None:
+        raise ValueError("не удалось загрузить изображение")
+    process_image(_worker_processor, method, image, output_path, tile_size, threads)
+    return os.path.getsize(input_path)
+
+
+def run_batch(args) -> None:
+    """
+    Обрабатывает каталог или шаблон glob пулом из args.jobs прогретых процессов.
+    """
+    output_dir = args.output.format(method=args.method) if args.output else None
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks, skipped = [], 0
+    for input_path in collect_inputs(args.input):
+        output_path = default_output_path(input_path, output_dir)
+        if not args.force and is_up_to_date(input_path, output_path):
+            skipped += 1
+            continue
+        tasks.append((input_path, output_path))
+
+    start = time.perf_counter()
+    options = (args.shape, args.dtype, args.tile_size, args.threads)
+    outcomes = []
+    if args.jobs <= 1:
+        _init_worker(backend=args.backend)
+        for input_path, output_path in tasks:
+            try:
+                outcomes.append(
+                    (input_path, _process_file(args.method, input_path, output_path, *options))
+                )
+            except Exception as e:
+                outcomes.append((input_path, e))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=args.jobs,
+            initializer=_init_worker,
+            initargs=(profiling.worker_config(), args.backend),
+        ) as executor:
+            futures = {
+                executor.submit(_process_file, args.method, input_path, output_path, *options): (
+                    input_path
+                )
+                for input_path, output_path in tasks
+            }
+            for future in as_completed(futures):
+                try:
+                    outcomes.append((futures[future], future.result()))
+                except Exception as e:
+                    outcomes.append((futures[future], e))
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    processed, failed, total_bytes = 0, 0, 0
+    for input_path, outcome in outcomes:
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"Ошибка: {input_path}: {outcome}")
+        else:
+            processed += 1
+            total_bytes += outcome
+
+    print(
+        f"Обработано {processed} изображений (пропущено {skipped}, ошибок {failed}) "
+        f"за {elapsed:.2f} с: {processed / elapsed:.2f} изобр./с, "
+        f"{total_bytes / elapsed / 2**20:.2f} МБ/с"
+    )
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(
@@ -47,44 +276,104 @@ def main() -> None:
     )
     parser.add_argument(
         "input",
-        help="Путь к входному изображению",
+        help="Путь к входному изображению, каталогу или шаблону glob (пакетный режим)",
     )
     parser.add_argument(
         "-o",
         "--output",
-        help="Путь для сохранения результата (по умолчанию: <input>_result.png)",
+        help="Путь для сохранения результата (по умолчанию: <input>_result.png); "
+        "в пакетном режиме - каталог результатов, допускается {method}",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Число рабочих процессов в пакетном режиме (по умолчанию: число ядер)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Обрабатывать входы, даже если результат уже актуален",
+    )
+    parser.add_argument(
+        "--shape",
+        type=int,
+        nargs="+",
+        help="Форма входа .raw, например: 4000 6000 3",
+    )
+    parser.add_argument(
+        "--dtype",
+        default="uint8",
+        help="Тип данных входа .raw (по умолчанию: uint8)",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=1024,
+        help="Сторона плитки в пикселях (по умолчанию: 1024)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Число потоков для обработки плиток (по умолчанию: 1)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + BACKENDS,
+        default="numpy",
+        help="Реализация метода: numpy (по умолчанию, по плиткам), scipy, opencv "
+        "или auto - выбор микробенчмарком; кроме numpy изображение обрабатывается целиком",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=profiling.PROFILE_MODES,
+        help="Профилировать запуск: cprofile (по умолчанию) или sample - выборка стеков",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="profile",
+        help="Префикс файлов профиля: <префикс>.pstats или .collapsed и <префикс>.memory.json",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Дополнительно отслеживать пик памяти через tracemalloc (замедляет работу)",
     )
 
     args = parser.parse_args()
 
+    with profiling.session(args.profile, args.profile_output, trace_memory=args.profile_memory):
+        if is_batch_input(args.input):
+            run_batch(args)
+        else:
+            run_single(args)
+    if args.profile:
+        print(f"Профиль сохранён с префиксом {args.profile_output}")
+
+
+def run_single(args) -> None:
     # Загрузка изображения
-    image = cv2.imread(args.input)
+    try:
+        with profiling.stage("load"):
+            image = load_image(args.input, shape=args.shape, dtype=args.dtype)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: не удалось загрузить изображение {args.input}: {e}")
+        return
     if image is None:
         print(f"Ошибка: не удалось загрузить изображение {args.input}")
         return
 
-    processor = ImageProcessing()
-
-    # Выбор метода
-    if args.method == "edges":
-        result = processor.edge_detection(image)
-    elif args.method == "corners":
-        result = processor.corner_detection(image)
-    elif args.method == "circles":
-        result = processor.circle_detection(image)
-    else:
-        print("Ошибка: неизвестный метод")
-        return
+    processor = ImageProcessing(backend=args.backend)
 
     # Определение пути для сохранения
-    if args.output:
-        output_path = args.output
-    else:
-        base, ext = os.path.splitext(args.input)
-        output_path = f"{base}_result.png"
+    output_path = args.output or default_output_path(args.input)
 
-    # Сохранение результата
-    cv2.imwrite(output_path, result)
+    # Обработка и сохранение результата
+    process_image(processor, args.method, image, output_path, args.tile_size, args.threads)
     print(f"Результат сохранён в {output_path}")
 
 
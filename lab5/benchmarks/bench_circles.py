@@ -0,0 +1,94 @@
+"""
+Сравнение ImageProcessing.detect_circles с cv2.HoughCircles на синтетическом кадре
+с известными окружностями.
+
+Запуск (из каталога lab5):
+    PYTHONPATH=src python benchmarks/bench_circles.py
+
+Завершается с ошибкой, если detect_circles медленнее MAX_MILLISECONDS.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from implementation.image_processing import ImageProcessing
+
+SHAPE = (720, 1280)
+CIRCLES = [(200, 200, 80), (640, 360, 150), (1000, 200, 40), (1100, 560, 90), (400, 560, 25)]
+REPEATS = 5
+# Порог времени detect_circles на кадре SHAPE (голосование по одному радиусу за раз
+# занимало около 1200 мс)
+MAX_MILLISECONDS = 600
+
+
+def make_image() -> np.ndarray:
+    yy, xx = np.mgrid[: SHAPE[0], : SHAPE[1]]
+    image = np.full(SHAPE + (3,), 40, dtype=np.float64)
+    for x, y, r in CIRCLES:
+        image[(xx - x) ** 2 + (yy - y) ** 2 <= r * r] = 190
+    noise = np.random.default_rng(0).normal(0, 10, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def matched(found: np.ndarray, tolerance: float = 3) -> int:
+    return sum(
+        any(
+            np.hypot(fx - x, fy - y) <= tolerance and abs(fr - r) <= tolerance
+            for fx, fy, fr in found
+        )
+        for x, y, r in CIRCLES
+    )
+
+
+def timed(function) -> tuple:
+    result = function()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        function()
+    return (time.perf_counter() - start) / REPEATS, result
+
+
+def main():
+    image = make_image()
+    processor = ImageProcessing()
+
+    elapsed, circles = timed(
+        lambda: processor.detect_circles(image, min_radius=20, max_radius=160, min_dist=20)
+    )
+    print(
+        f"ImageProcessing.detect_circles: {elapsed * 1000:8.1f} ms, "
+        f"found {len(circles)}, matched {matched(circles[:, :3])}/{len(CIRCLES)}"
+    )
+    if elapsed * 1000 > MAX_MILLISECONDS:
+        sys.exit(f"detect_circles is slower than {MAX_MILLISECONDS} ms")
+
+    try:
+        import cv2
+    except ImportError:
+        print("cv2.HoughCircles: OpenCV is not installed, skipped")
+        return
+
+    gray = cv2.GaussianBlur(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY), (0, 0), 1.5)
+    elapsed, circles = timed(
+        lambda: cv2.HoughCircles(
+            gray,
+            cv2.HOUGH_GRADIENT,
+            dp=1,
+            minDist=20,
+            param1=100,
+            param2=30,
+            minRadius=20,
+            maxRadius=160,
+        )
+    )
+    circles = np.empty((0, 3)) if circles is None else circles[0]
+    print(
+        f"cv2.HoughCircles:              {elapsed * 1000:8.1f} ms, "
+        f"found {len(circles)}, matched {matched(circles)}/{len(CIRCLES)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
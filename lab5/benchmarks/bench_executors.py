@@ -0,0 +1,65 @@
+"""
+Сравнение способов выполнения пакета в CatImageProcessor: в текущем потоке,
+пулом потоков и пулом процессов, а также выбора "auto", на типичных формах пакетов.
+
+Запуск (из каталога lab5):
+    PYTHONPATH=src python benchmarks/bench_executors.py
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from implementation.cat_image import CatImage
+from implementation.cat_image_processor import CatImageProcessor
+
+REPEATS = 3
+
+# (число изображений, высота, ширина)
+BATCH_SHAPES = [
+    (16, 32, 32),
+    (64, 128, 128),
+    (16, 512, 512),
+    (8, 1024, 1024),
+    (4, 2048, 2048),
+]
+
+STRATEGIES = ("inline", "threads", "processes", "auto")
+
+
+def make_batch(count: int, height: int, width: int) -> list:
+    rng = np.random.default_rng(0)
+    return [
+        CatImage(image=rng.integers(0, 256, (height, width, 3), dtype=np.uint8), index=i)
+        for i in range(count)
+    ]
+
+
+async def measure(strategy: str, batch: list) -> float:
+    async with CatImageProcessor(executor=strategy) as processor:
+        # прогрев пула
+        await processor.process_images_parallel(batch)
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            await processor.process_images_parallel(batch)
+        return (time.perf_counter() - start) / REPEATS
+
+
+async def main():
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'batch':>18} " + " ".join(f"{strategy:>10}" for strategy in STRATEGIES) + "  auto ->")
+    for count, height, width in BATCH_SHAPES:
+        batch = make_batch(count, height, width)
+        timings = [await measure(strategy, batch) for strategy in STRATEGIES]
+        choice = CatImageProcessor().choose_strategy(batch)
+        print(
+            f"{count:>4} x {height:>4}x{width:<5} "
+            + " ".join(f"{timing * 1000:8.1f}ms" for timing in timings)
+            + f"  {choice}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
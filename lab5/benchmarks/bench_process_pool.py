@@ -0,0 +1,57 @@
+"""
+Сравнение фиксированных накладных расходов на пакет: новый пул на каждый вызов
+против постоянного пула CatImageProcessor с прогретыми рабочими процессами.
+
+Запуск (из каталога lab5):
+    PYTHONPATH=src python benchmarks/bench_process_pool.py
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from implementation.cat_image import CatImage
+from implementation.cat_image_processor import CatImageProcessor
+
+BATCHES = 10
+BATCH_SIZE = 4
+IMAGE_SHAPE = (64, 64, 3)
+
+
+def make_batch() -> list:
+    rng = np.random.default_rng(0)
+    return [
+        CatImage(image=rng.integers(0, 256, IMAGE_SHAPE, dtype=np.uint8), index=i)
+        for i in range(BATCH_SIZE)
+    ]
+
+
+async def cold_pool(batch: list) -> float:
+    start = time.perf_counter()
+    for _ in range(BATCHES):
+        processor = CatImageProcessor(executor="processes")
+        async with processor:
+            await processor.process_images_parallel(batch)
+    return (time.perf_counter() - start) / BATCHES
+
+
+async def warm_pool(batch: list) -> float:
+    async with CatImageProcessor(executor="processes") as processor:
+        await processor.process_images_parallel(batch)
+        start = time.perf_counter()
+        for _ in range(BATCHES):
+            await processor.process_images_parallel(batch)
+        return (time.perf_counter() - start) / BATCHES
+
+
+async def main():
+    batch = make_batch()
+    cold = await cold_pool(batch)
+    warm = await warm_pool(batch)
+    print(f"new pool per batch:   {cold * 1000:8.2f} ms/batch")
+    print(f"persistent warm pool: {warm * 1000:8.2f} ms/batch")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,49 @@
-from .cat_api_client import CatAPIClient
-from .cat_image import CatImage
-from .cat_image_processor import CatImageProcessor
-from .logger import PipelineLogger
+import importlib
+from typing import TYPE_CHECKING
 
-print(__name__)
-__all__ = ["CatImage", "CatImageProcessor", "CatAPIClient", "PipelineLogger"]
+# Подмодули загружаются при первом обращении к атрибуту (PEP 562), поэтому
+# "import implementation" не тянет за собой aiohttp, PIL и SciPy
+_LAZY_ATTRIBUTES = {
+    "CatAPIClient": ".cat_api_client",
+    "CatImage": ".cat_image",
+    "CatImageProcessor": ".cat_image_processor",
+    "ImageCache": ".image_cache",
+    "ImageProcessing": ".image_processing",
+    "PipelineLogger": ".logger",
+    "ResultCache": ".result_cache",
+    "SharedImageBuffer": ".shared_image_buffer",
+}
+
+__all__ = [
+    "CatAPIClient",
+    "CatImage",
+    "CatImageProcessor",
+    "ImageCache",
+    "ImageProcessing",
+    "PipelineLogger",
+    "ResultCache",
+    "SharedImageBuffer",
+]
+
+if TYPE_CHECKING:
+    from .cat_api_client import CatAPIClient
+    from .cat_image import CatImage
+    from .cat_image_processor import CatImageProcessor
+    from .image_cache import ImageCache
+    from .image_processing import ImageProcessing
+    from .logger import PipelineLogger
+    from .result_cache import ResultCache
+    from .shared_image_buffer import SharedImageBuffer
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,5 +1,11 @@
+import asyncio
+
+
 def main():
-    print("main", __name__)
+    from implementation.cat_pipeline import run_pipeline_async
+
+    asyncio.run(run_pipeline_async(limit=5))
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,221 @@
 import asyncio
-from io import BytesIO
-from typing import List, Optional
+import random
+import time
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
 import numpy as np
-from PIL import Image
 
-from implementation.cat_image import CatImage
+from implementation.cat_image import CatImage, decode_image
+from implementation.image_cache import ImageCache
+from implementation.metrics import MetricsRegistry
+
+
+@dataclass
+class DownloadStats:
+    attempts: int = 0
+    failures: int = 0
+    hedged: int = 0
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    succeeded: bool = False
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
 
 
 class CatAPIClient:
-    def __init__(self, api_key: Optional[str] = None, url: str = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        url: str = None,
+        max_concurrency: int = 16,
+        limit_per_host: int = 8,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        decode_executor: Optional[Executor] = None,
+        target_size: Optional[Tuple[int, int]] = None,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        cache: Optional[ImageCache] = None,
+        lazy_decode: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
         self.api_key = api_key
         self.url = url
+        self._max_concurrency = max_concurrency
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # None - пул потоков цикла событий по умолчанию
+        self._decode_executor = decode_executor
+        self._target_size = target_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._retries = retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        # хеджирование: повторный запрос, если первый дольше заданного перцентиля задержек
+        self._hedge_percentile = hedge_percentile
+        self._hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=1000)
+        self.download_stats: Dict[str, DownloadStats] = {}
+        self.cache = cache
+        # без кэша изображение можно вернуть закодированным и декодировать при обращении к image
+        self._lazy_decode = lazy_decode
+        # стадии download и decode, счётчик bytes_downloaded
+        self.metrics = metrics or MetricsRegistry()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_concurrency,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=self._dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self.cache is not None:
+            self.cache.flush()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
 
     async def fetch_cats_urls(self, limit: int) -> List[dict]:
         headers = {"x-api-key": self.api_key} if self.api_key else {}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.url, headers=headers, params={"limit": limit}) as response:
-                response.raise_for_status()
-                return await response.json()
-
-    @staticmethod
-    async def download_image(url: str, index: int) -> CatImage:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                img_data = await response.read()
-                img_pil = Image.open(BytesIO(img_data)).convert("RGB")
-                return CatImage(image=np.array(img_pil), url=url, index=index)
+        session = self._get_session()
+        async with session.get(self.url, headers=headers, params={"limit": limit}) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    def _backoff(self, attempt: int) -> float:
+        # экспоненциальная задержка с полным джиттером
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * 2**attempt))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self._hedge_percentile is None or len(self._latencies) < self._hedge_min_samples:
+            return None
+        return float(np.percentile(self._latencies, self._hedge_percentile))
+
+    async def _fetch(self, url: str, headers: dict) -> Tuple[int, bytes, dict]:
+        async with self._get_session().get(url, headers=headers, timeout=self._timeout) as response:
+            response.raise_for_status()
+            return response.status, await response.read(), response.headers.copy()
+
+    async def _fetch_hedged(self, url: str, stats: DownloadStats, headers: dict):
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._fetch(url, headers)
+
+        primary = asyncio.ensure_future(self._fetch(url, headers))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                stats.hedged += 1
+                pending.add(asyncio.ensure_future(self._fetch(url, headers)))
+
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _download(self, url: str, headers: dict) -> Tuple[int, bytes, dict]:
+        stats = self.download_stats.setdefault(url, DownloadStats())
+        for attempt in range(self._retries + 1):
+            stats.attempts += 1
+            try:
+                async with self._semaphore:
+                    # время ожидания семафора не входит в задержку, иначе оно завышает
+                    # перцентиль для хеджирования
+                    start = time.perf_counter()
+                    result = await self._fetch_hedged(url, stats, headers)
+            except Exception as e:
+                stats.failures += 1
+                stats.error = repr(e)
+                if attempt == self._retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                stats.latency = time.perf_counter() - start
+                stats.succeeded = True
+                stats.error = None
+                self._latencies.append(stats.latency)
+                return result
+
+    async def download_image(self, url: str, index: int) -> CatImage:
+        loop = asyncio.get_running_loop()
+        entry = self.cache.lookup(url, self._target_size) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            image = await loop.run_in_executor(None, self.cache.load, url, self._target_size)
+            if image is not None:
+                return CatImage(image=image, url=url, index=index)
+            entry = None
+
+        headers = ImageCache.validators(entry) if entry is not None else {}
+        with self.metrics.stage("download"):
+            status, img_data, response_headers = await self._download(url, headers)
+        if status == 304 and entry is not None:
+            image = await loop.run_in_executor(None, self.cache.load, url, self._target_size, True)
+            if image is not None:
+                return CatImage(image=image, url=url, index=index)
+            # запись пропала из кэша после проверки - нужно само изображение
+            with self.metrics.stage("download"):
+                status, img_data, response_headers = await self._download(url, {})
+        self.metrics.count("bytes_downloaded", len(img_data))
+
+        if self._lazy_decode and self.cache is None:
+            return CatImage.from_bytes(img_data, url, index, target_size=self._target_size)
+
+        with self.metrics.stage("decode"):
+            image = await loop.run_in_executor(
+                self._decode_executor, decode_image, img_data, self._target_size
+            )
+        if self.cache is not None:
+            try:
+                await loop.run_in_executor(
+                    None,
+                    self.cache.store,
+                    url,
+                    img_data,
+                    image,
+                    response_headers,
+                    self._target_size,
+                )
+            except OSError:
+                # ошибка записи на диск не должна отменять уже скачанное изображение
+                pass
+        return CatImage(image=image, url=url, index=index)
 
     async def download_images(self, urls_with_indices: List[tuple]) -> List[CatImage]:
         tasks = [self.download_image(url, index) for url, index in urls_with_indices]
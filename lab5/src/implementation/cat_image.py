@@ -1,30 +1,235 @@
-from dataclasses import dataclass
+import math
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
 
 import numpy as np
 
+from . import profiling
+
+
+def _open(source):
+    from PIL import Image
+
+    return Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+
+def _thumbnail_size(size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Размер, который получит Image.thumbnail(target_size) для кадра size (ширина, высота)."""
+    width, height = size
+    x, y = map(math.floor, target_size)
+    if x >= width and y >= height:
+        return width, height
+
+    def round_aspect(number: float, key) -> int:
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        return round_aspect(y * aspect, key=lambda n: abs(aspect - n / y)), y
+    return x, round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+
+
+def decode_image(source, target_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    Декодирует изображение (байты или путь к файлу) в RGB-массив.
+
+    Для JPEG с заданным target_size (ширина, высота) используется Image.draft:
+    декодер сразу масштабирует DCT-блоки в 2/4/8 раз и не распаковывает полный кадр.
+    Результат берётся через np.asarray без промежуточной копии np.array,
+    поэтому он доступен только для чтения.
+    """
+    with profiling.stage("decode"):
+        img_pil = _open(source)
+        if target_size is not None:
+            img_pil.draft("RGB", target_size)
+            img_pil.thumbnail(target_size)
+        if img_pil.mode != "RGB":
+            img_pil = img_pil.convert("RGB")
+        return np.asarray(img_pil)
+
 
-@dataclass
 class CatImage:
-    image: np.ndarray = None
-    url: str = None
-    index: int = None
+    """
+    Изображение кота с адресом и номером.
+
+    Пиксели можно передать сразу (image) или отложить: source - закодированные байты
+    либо путь к файлу, они декодируются при первом обращении к image. Форма ленивого
+    изображения читается из заголовка без декодирования, release() освобождает пиксели,
+    которые можно декодировать заново из source; без source release() ничего не делает.
+    Присваивание image (и арифметика на месте) отвязывает изображение от source.
+    """
+
+    __slots__ = ("_image", "source", "target_size", "url", "index")
+
+    def __init__(
+        self,
+        image: np.ndarray = None,
+        url: str = None,
+        index: int = None,
+        source=None,
+        target_size: Optional[Tuple[int, int]] = None,
+    ):
+        self._image = image
+        self.source = str(source) if isinstance(source, Path) else source
+        self.target_size = target_size
+        self.url = url
+        self.index = index
+
+    @classmethod
+    def from_bytes(cls, data: bytes, url: str = None, index: int = None, target_size=None):
+        return cls(url=url, index=index, source=data, target_size=target_size)
+
+    @classmethod
+    def from_path(cls, path, url: str = None, index: int = None, target_size=None):
+        return cls(url=url, index=index, source=path, target_size=target_size)
+
+    @property
+    def image(self) -> np.ndarray:
+        if self._image is None and self.source is not None:
+            self._image = decode_image(self.source, self.target_size)
+        return self._image
+
+    @image.setter
+    def image(self, value: np.ndarray):
+        # новые пиксели не совпадают с закодированным source: release() не должен
+        # подменять их декодированным оригиналом
+        self._image = value
+        self.source = None
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._image is not None
+
+    @property
+    def shape(self) -> Optional[tuple]:
+        """Форма массива пикселей; для ленивого изображения - по заголовку, без декодирования."""
+        if self._image is not None:
+            return self._image.shape
+        if self.source is None:
+            return None
+        with _open(self.source) as img_pil:
+            if self.target_size is not None:
+                img_pil.draft("RGB", self.target_size)
+                width, height = _thumbnail_size(img_pil.size, self.target_size)
+            else:
+                width, height = img_pil.size
+        return height, width, 3
+
+    def release(self):
+        if self.source is not None:
+            self._image = None
+
+    def __getstate__(self):
+        # ещё не декодированное изображение передаётся в другой процесс закодированным
+        return self._image, self.source, self.target_size, self.url, self.index
+
+    def __setstate__(self, state):
+        self._image, self.source, self.target_size, self.url, self.index = state
+
+    def _operand(self, other) -> np.ndarray:
+        """
+        Приводит второй операнд к массиву, совместимому с self.image.
+
+        Одноканальное изображение (H, W) добавляет ось каналов и транслируется на RGB
+        без копирования; для целого типа self.image значения ограничиваются его диапазоном.
+        """
+        other = other.image if isinstance(other, CatImage) else np.asarray(other)
+        if other.ndim == self.image.ndim - 1:
+            other = other[..., np.newaxis]
+        np.broadcast_shapes(self.image.shape, other.shape)
+
+        dtype = self.image.dtype
+        if other.dtype != dtype and np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            other = np.clip(other, info.min, info.max).astype(dtype)
+        return other
+
+    def _prepare_out(self, out: np.ndarray) -> np.ndarray:
+        if out is None:
+            return np.empty_like(self.image)
+        if out.shape != self.image.shape or out.dtype != self.image.dtype:
+            raise ValueError(
+                f"out must have shape {self.image.shape} and dtype {self.image.dtype}, "
+                f"got {out.shape} and {out.dtype}"
+            )
+        return out
+
+    @staticmethod
+    def _apply(ufunc, a: np.ndarray, b: np.ndarray, out: np.ndarray, **kwargs):
+        # трансляция по оси каналов длины 3 даёт короткий внутренний цикл и работает
+        # в разы медленнее, поэтому одноканальный операнд применяется к каналам по очереди
+        if b.ndim == a.ndim and b.shape[-1] == 1 and a.shape[-1] > 1:
+            for channel in range(a.shape[-1]):
+                ufunc(a[..., channel], b[..., 0], out=out[..., channel], **kwargs)
+        else:
+            ufunc(a, b, out=out, **kwargs)
+
+    def add(self, other, out: np.ndarray = None) -> "CatImage":
+        """
+        Складывает изображения с насыщением для беззнаковых целых типов (255 + 1 = 255).
+
+        Результат пишется в out (может совпадать с self.image) и имеет тип self.image.
+        """
+        other = self._operand(other)
+        out = self._prepare_out(out)
+        if np.issubdtype(self.image.dtype, np.unsignedinteger):
+            # min(a, max - b) + b не переполняется и не требует расширения типа
+            limit = np.subtract(np.iinfo(out.dtype).max, other, dtype=out.dtype)
+            self._apply(np.minimum, self.image, limit, out)
+            self._apply(np.add, out, other, out)
+        else:
+            self._apply(np.add, self.image, other, out, casting="unsafe")
+        return CatImage(image=out, url=self.url, index=self.index)
+
+    def subtract(self, other, out: np.ndarray = None) -> "CatImage":
+        """
+        Вычитает изображения с насыщением для беззнаковых целых типов (0 - 1 = 0).
+
+        Результат пишется в out (может совпадать с self.image) и имеет тип self.image.
+        """
+        other = self._operand(other)
+        out = self._prepare_out(out)
+        if np.issubdtype(self.image.dtype, np.unsignedinteger):
+            # max(a, b) - b не уходит ниже нуля
+            self._apply(np.maximum, self.image, other, out)
+            self._apply(np.subtract, out, other, out)
+        else:
+            self._apply(np.subtract, self.image, other, out, casting="unsafe")
+        return CatImage(image=out, url=self.url, index=self.index)
 
     def __add__(self, other):
-        if not isinstance(other, CatImage):
-            return ValueError(f"Passed {type(other)}, needs CatImage object")
-        if len(self.image):
-            result_image = self.image + other.image
-            return CatImage(image=result_image, index=self.index)
+        if not isinstance(other, (CatImage, np.ndarray)):
+            return NotImplemented
+        return self.add(other)
 
     def __sub__(self, other):
-        if not isinstance(other, CatImage):
-            return ValueError(f"Passed {type(other)}, needs CatImage object")
-        if len(self.image):
-            result_image = self.image - other.image
-            return CatImage(image=result_image, index=self.index)
+        if not isinstance(other, (CatImage, np.ndarray)):
+            return NotImplemented
+        return self.subtract(other)
+
+    def _writable_image(self) -> np.ndarray:
+        # decode_image и кэш изображений отдают массивы только для чтения (np.asarray
+        # поверх буфера PIL, memmap), такие пиксели копируются перед записью на месте
+        image = self.image
+        if not image.flags.writeable:
+            image = image.copy()
+        self.image = image
+        return image
+
+    def __iadd__(self, other):
+        if not isinstance(other, (CatImage, np.ndarray)):
+            return NotImplemented
+        self.add(other, out=self._writable_image())
+        return self
+
+    def __isub__(self, other):
+        if not isinstance(other, (CatImage, np.ndarray)):
+            return NotImplemented
+        self.subtract(other, out=self._writable_image())
+        return self
 
     def __str__(self):
-        return (
-            f"CatImage(url={self.url}, image_shape={None if not len(self.image) else self.image.shape}, "
-            f"index=f{self.index})"
-        )
+        return f"CatImage(url={self.url}, image_shape={self.shape}, index={self.index})"
+
+    __repr__ = __str__
@@ -1,36 +1,282 @@
 import asyncio
 import logging
 import os
-from concurrent.futures import ProcessPoolExecutor
-from typing import List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
 
+import numpy as np
+
+from . import profiling
 from .cat_image import CatImage
 from .image_processing import ImageProcessing
+from .logger import LOGGER_NAME, configure_worker_logging, timeit, worker_log_queue
+from .result_cache import ResultCache
+from .shared_image_buffer import SharedImageBuffer
+
+logger = logging.getLogger(LOGGER_NAME)
+
+EXECUTOR_STRATEGIES = ("auto", "processes", "threads", "inline")
+
+# Пакет меньше этого числа пикселей быстрее обработать в текущем потоке, чем раздать пулу
+INLINE_MAX_PIXELS = 1 << 16
+
+# Изображения от этого числа пикселей обрабатываются потоками: ядра NumPy на больших
+# массивах отпускают GIL, а передача пикселей в процесс стоит дороже самой обработки
+THREADS_MIN_PIXELS = 1 << 18
+
+# Экземпляр обработчика внутри рабочего процесса пула, создаётся инициализатором
+_worker_processor = None
+
+
+def _init_worker(
+    image_data_type, convolution_method: str, backend: str = "auto", log_queue=None, profile=None
+):
+    global _worker_processor
+    configure_worker_logging(log_queue)
+    profiling.start_worker_profiler(profile)
+    _worker_processor = CatImageProcessor(
+        image_data_type=image_data_type, convolution_method=convolution_method, backend=backend
+    )
+    # прогрев: первые вызовы NumPy/SciPy инициализируют внутренние кэши
+    _worker_processor.edge_detection(np.random.default_rng(0).integers(0, 256, (8, 8, 3)))
+    logger.debug(f"Worker {os.getpid()} is ready")
+
+
+def _edge_detection_cat(cat_image: CatImage) -> CatImage:
+    return _worker_processor.edge_detection_cat(cat_image)
+
 
-logger = logging.getLogger("pipeline_logger")
+def _edge_detection_shared(index: int, source: tuple, target: tuple) -> int:
+    return _worker_processor.edge_detection_shared(index, source, target)
 
 
 class CatImageProcessor(ImageProcessing):
+    def __init__(
+        self,
+        image_data_type=None,
+        convolution_method: str = "auto",
+        max_workers: int = None,
+        result_cache: ResultCache = None,
+        executor: str = "auto",
+        backend: str = "auto",
+    ):
+        super().__init__(
+            image_data_type=image_data_type,
+            convolution_method=convolution_method,
+            result_cache=result_cache,
+            backend=backend,
+        )
+        if executor not in EXECUTOR_STRATEGIES:
+            raise ValueError(
+                f"Unknown executor strategy {executor!r}, expected one of {EXECUTOR_STRATEGIES}"
+            )
+        self._max_workers = max_workers
+        self._strategy = executor
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread_executor: Optional[ThreadPoolExecutor] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_thread_executor"] = None
+        # кэш результатов локален для процесса
+        state["_result_cache"] = None
+        return state
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting process pool (max_workers={self._max_workers})")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                initializer=_init_worker,
+                initargs=(
+                    self._image_data_type,
+                    self._convolution_method,
+                    self._backend,
+                    worker_log_queue(),
+                    profiling.worker_config(),
+                ),
+            )
+        return self._executor
+
+    def _get_thread_executor(self) -> ThreadPoolExecutor:
+        if self._thread_executor is None:
+            logger.info(f"Starting thread pool (max_workers={self._max_workers})")
+            self._thread_executor = ThreadPoolExecutor(
+                max_workers=self._max_workers or os.cpu_count(), thread_name_prefix="edges"
+            )
+        return self._thread_executor
+
+    def choose_strategy(self, cat_images: List[CatImage]) -> str:
+        """
+        Выбирает способ выполнения пакета: заданный в конструкторе или, для "auto",
+        по размеру изображений и числу ядер.
+
+        Маленький пакет обрабатывается на месте, пакет из больших изображений - потоками,
+        остальные - пулом процессов. На одном ядре вместо процессов тоже используются
+        потоки: обработка на месте блокировала бы цикл событий и загрузку изображений.
+        Если профилировщик не может выделить стадию process в потоках (cProfile
+        в Python 3.12+), потоки заменяются пулом процессов, у каждого свой профиль.
+        """
+        strategy = self._strategy
+        if strategy == "auto":
+            pixels = [shape[0] * shape[1] for shape in (c.shape for c in cat_images) if shape]
+            if sum(pixels) < INLINE_MAX_PIXELS:
+                strategy = "inline"
+            elif min(pixels) >= THREADS_MIN_PIXELS or (os.cpu_count() or 1) == 1:
+                strategy = "threads"
+            else:
+                strategy = "processes"
+        if strategy == "threads" and not profiling.thread_stages_profiled():
+            return "processes"
+        return strategy
+
+    def shutdown(self, wait: bool = True):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            logger.info("Process pool stopped")
+        thread_executor, self._thread_executor = self._thread_executor, None
+        if thread_executor is not None:
+            thread_executor.shutdown(wait=wait)
+            logger.info("Thread pool stopped")
+
+    async def start(self):
+        if self._strategy == "processes":
+            self._get_executor()
+        elif self._strategy == "threads":
+            self._get_thread_executor()
+        return self
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @timeit
     def edge_detection_cat(self, cat_image: CatImage) -> CatImage:
         logger.info(f"Convolution for image {cat_image.index} started (PID {os.getpid()})")
 
         if cat_image.image is None:
             raise ValueError("CatImage has no image data")
 
-        edges = self.edge_detection(cat_image.image)
+        with profiling.stage("process"):
+            edges = self.apply("edges", cat_image.image)
         logger.info(f"Convolution for image {cat_image.index} finished (PID {os.getpid()})")
         return CatImage(image=edges, url=cat_image.url, index=cat_image.index)
 
-    async def process_images_parallel(self, cat_images: List[CatImage]) -> List[CatImage]:
-        logger.info("Starting parallel image processing...")
+    def edge_detection_cat_batch(self, cat_images: List[CatImage]) -> List[CatImage]:
+        logger.info(f"Batched convolution for {len(cat_images)} images started (PID {os.getpid()})")
+
+        if any(cat_image.image is None for cat_image in cat_images):
+            raise ValueError("CatImage has no image data")
+
+        edges = self.edge_detection_batch([cat_image.image for cat_image in cat_images])
+        logger.info(
+            f"Batched convolution for {len(cat_images)} images finished (PID {os.getpid()})"
+        )
+        return [
+            CatImage(image=image_edges, url=cat_image.url, index=cat_image.index)
+            for cat_image, image_edges in zip(cat_images, edges)
+        ]
+
+    def edge_detection_shared(self, index: int, source: tuple, target: tuple) -> int:
+        logger.info(f"Shared-memory convolution for image {index} started (PID {os.getpid()})")
+
+        with SharedImageBuffer.attach(*source) as image, SharedImageBuffer.attach(*target) as edges:
+            self.edge_detection(image.array, out=edges.array)
+
+        logger.info(f"Shared-memory convolution for image {index} finished (PID {os.getpid()})")
+        return index
+
+    async def process_image(self, cat_image: CatImage) -> CatImage:
+        return (await self._run(self.choose_strategy([cat_image]), [cat_image]))[0]
+
+    async def process_images_parallel(
+        self, cat_images: List[CatImage], shared_memory: bool = False
+    ) -> List[CatImage]:
+        """
+        Находит границы на пакете изображений.
+
+        shared_memory=True передаёт пиксели рабочим процессам через разделяемую память
+        и всегда использует пул процессов; иначе способ выполнения выбирает choose_strategy.
+        """
+        strategy = "processes" if shared_memory else self.choose_strategy(cat_images)
+        logger.info(f"Starting parallel image processing ({strategy})...")
+
+        if shared_memory:
+            loop = asyncio.get_running_loop()
+            try:
+                results = await self._process_images_shared(loop, self._get_executor(), cat_images)
+            except BrokenProcessPool:
+                self.shutdown(wait=False)
+                raise
+        else:
+            results = await self._run(strategy, cat_images)
+
+        logger.info("Parallel image processing completed")
+        return results
+
+    async def _run(self, strategy: str, cat_images: List[CatImage]) -> List[CatImage]:
+        if strategy == "inline":
+            return [self.edge_detection_cat(cat_image) for cat_image in cat_images]
+
+        if strategy == "threads":
+            executor, function = self._get_thread_executor(), self.edge_detection_cat
+        else:
+            executor, function = self._get_executor(), _edge_detection_cat
 
         loop = asyncio.get_running_loop()
-        with ProcessPoolExecutor() as executor:
+        try:
+            return await asyncio.gather(
+                *(loop.run_in_executor(executor, function, cat_image) for cat_image in cat_images)
+            )
+        except BrokenProcessPool:
+            # упавший пул не переиспользуется, следующий вызов поднимет новый
+            self.shutdown(wait=False)
+            raise
+
+    async def _process_images_shared(self, loop, executor, cat_images: List[CatImage]):
+        """
+        Передаёт изображения рабочим процессам через разделяемую память.
+
+        Рабочему уходят только имена, формы и типы сегментов; результат пишется
+        в заранее выделенный выходной сегмент. Все сегменты принадлежат этому
+        процессу и освобождаются в finally, в том числе при падении рабочего.
+        """
+        buffers = []
+        try:
+            jobs = []
+            for cat_image in cat_images:
+                if cat_image.image is None:
+                    raise ValueError("CatImage has no image data")
+                source = SharedImageBuffer.from_array(cat_image.image)
+                buffers.append(source)
+                target = SharedImageBuffer.create(cat_image.image.shape[:2], self._image_data_type)
+                buffers.append(target)
+                jobs.append((cat_image, source, target))
+
             tasks = [
-                loop.run_in_executor(executor, self.edge_detection_cat, cat_image)
-                for cat_image in cat_images
+                loop.run_in_executor(
+                    executor, _edge_detection_shared, cat_image.index, source.spec, target.spec
+                )
+                for cat_image, source, target in jobs
             ]
-            results = await asyncio.gather(*tasks)
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    raise outcome
 
-        logger.info("Parallel image processing completed")
-        return results
+            return [
+                CatImage(image=target.array.copy(), url=cat_image.url, index=cat_image.index)
+                for cat_image, _, target in jobs
+            ]
+        finally:
+            for buffer in buffers:
+                buffer.close()
+                buffer.unlink()
@@ -1,5 +1,7 @@
+import argparse
 import asyncio
 import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 
@@ -8,8 +10,12 @@ import numpy as np
 from dotenv import load_dotenv
 from PIL import Image
 
+from implementation import profiling
+from implementation.backends import BACKENDS
 from implementation.cat_api_client import CatAPIClient
+from implementation.cat_image import CatImage
 from implementation.cat_image_processor import CatImageProcessor
+from implementation.image_cache import ImageCache
 from implementation.logger import PipelineLogger
 
 pipeline_logger = PipelineLogger()
@@ -17,52 +23,255 @@ DATA_DIR = Path("data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 load_dotenv()
 
+# Форматы сохранения: расширение файла и степень сжатия по умолчанию
+# (compress_level 0-9 для PNG, quality 0-100 для WebP, .npy пишется без сжатия)
+SAVE_FORMATS = {"png": (".png", 6), "webp": (".webp", 80), "npy": (".npy", None)}
 
-async def save_image_async(image_array: np.ndarray, file_path: Path):
-    img_pil = Image.fromarray(image_array.astype(np.uint8))
 
-    buffer = BytesIO()
-    img_pil.save(buffer, format="PNG")
+def encode_image(
+    image_array: np.ndarray, target, image_format: str = "png", compression: int = None
+):
+    """
+    Кодирует изображение (массив или CatImage) в файл или файловый объект target.
+
+    Вызывается в рабочем потоке: PIL и zlib отпускают GIL на время сжатия,
+    поэтому кодирование, как и отложенное декодирование CatImage, не блокирует цикл событий.
+    """
+    if image_format not in SAVE_FORMATS:
+        raise ValueError(f"Unknown format {image_format!r}, expected one of {list(SAVE_FORMATS)}")
+    if isinstance(image_array, CatImage):
+        image_array = image_array.image
+    image_array = image_array.astype(np.uint8, copy=False)
+    with pipeline_logger.metrics.stage("encode"), profiling.stage("encode"):
+        if image_format == "npy":
+            np.save(target, image_array)
+            return
+
+        if compression is None:
+            compression = SAVE_FORMATS[image_format][1]
+        options = (
+            {"compress_level": compression} if image_format == "png" else {"quality": compression}
+        )
+        Image.fromarray(image_array).save(target, format=image_format.upper(), **options)
+
+
+async def save_image_async(
+    image_array,
+    file_path: Path,
+    image_format: str = "png",
+    compression: int = None,
+    executor: Executor = None,
+    direct: bool = True,
+):
+    """
+    Сохраняет изображение, кодируя его в executor (по умолчанию - пул потоков цикла событий).
+
+    При direct=True кодировщик пишет прямо в файл; иначе результат собирается в памяти
+    и записывается через aiofiles без копирования буфера.
+    """
+    loop = asyncio.get_running_loop()
+    if direct:
+        await loop.run_in_executor(
+            executor, encode_image, image_array, file_path, image_format, compression
+        )
+        return
 
+    buffer = BytesIO()
+    await loop.run_in_executor(
+        executor, encode_image, image_array, buffer, image_format, compression
+    )
     async with aiofiles.open(file_path, "wb") as f:
-        await f.write(buffer.getvalue())
+        await f.write(buffer.getbuffer())
+
+
+async def _run_stage(name: str, queue: asyncio.Queue, workers: int, handle):
+    """
+    Запускает workers обработчиков, читающих queue до получения None.
+
+    Ошибка на одном элементе логируется и не останавливает стадию.
+    """
+
+    async def worker():
+        while (item := await queue.get()) is not None:
+            try:
+                await handle(item)
+            except Exception as e:
+                pipeline_logger.logger.error(f"Stage '{name}' failed: {e!r}")
+                pipeline_logger.metrics.count("images_failed")
 
+    await asyncio.gather(*(worker() for _ in range(workers)))
 
-@pipeline_logger.timeit
-async def run_pipeline_async(limit: int = 10):
-    client = CatAPIClient(api_key=os.getenv("API_KEY"), url=os.getenv("BASE_URL"))
-    processor = CatImageProcessor()
 
-    pipeline_logger.logger.info("Fetching cat URLs...")
-    pipeline_logger.logger.debug("debug!!!...")
-    cat_data = await client.fetch_cats_urls(limit=limit)
-    urls_with_indices = [(entry["url"], idx + 1) for idx, entry in enumerate(cat_data)]
+async def _finish_stage(stage, next_queue: asyncio.Queue, next_workers: int):
+    await stage
+    for _ in range(next_workers):
+        await next_queue.put(None)
 
-    pipeline_logger.logger.info("Downloading images...")
-    cat_images = await client.download_images(urls_with_indices)
-    valid_images = [img for img in cat_images if not isinstance(img, Exception)]
 
-    pipeline_logger.logger.info("Saving original images...")
-    save_tasks = []
-    for cat_image in valid_images:
-        path = DATA_DIR / f"{cat_image.index}_original.png"
-        save_tasks.append(save_image_async(cat_image.image, path))
-    await asyncio.gather(*save_tasks)
+@pipeline_logger.timeit(log=True)
+async def run_pipeline_async(
+    limit: int = 10,
+    download_workers: int = 8,
+    process_workers: int = None,
+    save_workers: int = 4,
+    queue_size: int = 16,
+    cache_dir: str = None,
+    save_format: str = "png",
+    save_compression: int = None,
+    enhance: bool = False,
+    metrics_path: str = None,
+    metrics_format: str = "json",
+    profile: str = None,
+    profile_output: str = "profile",
+    profile_memory: bool = False,
+    backend: str = "auto",
+):
+    """
+    Потоковый конвейер: загрузка -> обработка -> сохранение.
 
-    pipeline_logger.logger.info("Processing images...")
-    processed_images = await processor.process_images_parallel(valid_images)
+    Стадии связаны ограниченными очередями asyncio.Queue(queue_size), поэтому каждое
+    изображение уходит в обработку сразу после загрузки и сохраняется сразу после
+    обработки. В памяти одновременно находится не больше изображений, чем помещается
+    в очереди и обрабатывается воркерами, независимо от limit.
+    Если задан cache_dir, загруженные изображения кэшируются на диске между запусками.
+    Изображения кодируются в save_format (png, webp, npy) в отдельном пуле потоков.
+    Границы ищутся реализацией backend (numpy, scipy, opencv или auto - выбор
+    микробенчмарком, см. backends.registry).
+    При enhance=True дополнительно сохраняется исходное изображение за вычетом границ.
+    Длительности стадий и счётчики копятся в pipeline_logger.metrics; если задан
+    metrics_path (файл или http-адрес), они экспортируются туда в metrics_format
+    (json или prometheus) по завершении.
+    При profile (cprofile или sample) основной процесс и рабочие процессы обработки
+    профилируются по стадиям decode, process и encode (в потоках, рабочих процессах или
+    на месте); загрузка и сохранение идут в цикле событий вперемешку, поэтому остаются
+    в общей стадии main и различаются по корутинам в стеке. Профили объединяются
+    в <profile_output>.pstats (по стадиям - <profile_output>.<стадия>.pstats) или .collapsed,
+    пиковая память процессов - в <profile_output>.memory.json (с profile_memory
+    дополнительно пик tracemalloc).
+    """
+    if save_format not in SAVE_FORMATS:
+        raise ValueError(f"Unknown format {save_format!r}, expected one of {list(SAVE_FORMATS)}")
+    suffix = SAVE_FORMATS[save_format][0]
+    process_workers = process_workers or os.cpu_count() or 1
 
-    pipeline_logger.logger.info("Saving processed images...")
-    save_tasks = []
-    for processed in processed_images:
-        proc_path = DATA_DIR / f"{processed.index}_processed.png"
-        save_tasks.append(save_image_async(processed.image.astype(np.uint8), proc_path))
-    await asyncio.gather(*save_tasks)
+    download_queue = asyncio.Queue(maxsize=queue_size)
+    process_queue = asyncio.Queue(maxsize=queue_size)
+    save_queue = asyncio.Queue(maxsize=queue_size)
+    saved = {"original": 0, "processed": 0, "enhanced": 0}
+    metrics = pipeline_logger.metrics
+
+    async def download(item):
+        url, index = item
+        cat_image = await client.download_image(url, index)
+        await save_queue.put(("original", cat_image))
+        await process_queue.put(cat_image)
+
+    async def process(cat_image):
+        with metrics.stage("process"):
+            processed = await processor.process_image(cat_image)
+        await save_queue.put(("processed", processed))
+        if enhance:
+            await save_queue.put(("enhanced", cat_image - processed))
+
+    async def save(item):
+        kind, cat_image = item
+        with metrics.stage("save"):
+            await save_image_async(
+                cat_image,
+                DATA_DIR / f"{cat_image.index}_{kind}{suffix}",
+                image_format=save_format,
+                compression=save_compression,
+                executor=encode_executor,
+            )
+        saved[kind] += 1
+
+    async def feed():
+        for idx, entry in enumerate(cat_data):
+            await download_queue.put((entry["url"], idx + 1))
+        for _ in range(download_workers):
+            await download_queue.put(None)
+
+    with profiling.session(profile, profile_output, trace_memory=profile_memory):
+        async with (
+            CatAPIClient(
+                api_key=os.getenv("API_KEY"),
+                url=os.getenv("BASE_URL"),
+                max_concurrency=download_workers,
+                cache=ImageCache(cache_dir) if cache_dir else None,
+                metrics=metrics,
+            ) as client,
+            CatImageProcessor(backend=backend) as processor,
+        ):
+            pipeline_logger.logger.info("Fetching cat URLs...")
+            with metrics.stage("fetch"):
+                cat_data = await client.fetch_cats_urls(limit=limit)
+
+            pipeline_logger.logger.info("Streaming images through download -> process -> save...")
+            encode_executor = ThreadPoolExecutor(save_workers, thread_name_prefix="encode")
+            try:
+                await asyncio.gather(
+                    feed(),
+                    _finish_stage(
+                        _run_stage("download", download_queue, download_workers, download),
+                        process_queue,
+                        process_workers,
+                    ),
+                    _finish_stage(
+                        _run_stage("process", process_queue, process_workers, process),
+                        save_queue,
+                        save_workers,
+                    ),
+                    _run_stage("save", save_queue, save_workers, save),
+                )
+            finally:
+                encode_executor.shutdown()
+
+            for url, stats in client.download_stats.items():
+                if not stats.succeeded:
+                    pipeline_logger.logger.warning(
+                        f"Failed to download {url} after {stats.attempts} attempts: {stats.error}"
+                    )
 
     pipeline_logger.logger.info(
-        f"Pipeline completed. Saved {len(valid_images)} images to {DATA_DIR}"
+        f"Pipeline completed. Saved {saved['original']} original, "
+        f"{saved['processed']} processed and {saved['enhanced']} enhanced images to {DATA_DIR}"
     )
+    pipeline_logger.log_metrics()
+    if metrics_path:
+        await asyncio.get_running_loop().run_in_executor(
+            None, metrics.export, metrics_path, metrics_format
+        )
 
 
 if __name__ == "__main__":
-    asyncio.run(run_pipeline_async(limit=5))
+    parser = argparse.ArgumentParser(description="Загрузка, обработка и сохранение котов")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--format", dest="save_format", choices=list(SAVE_FORMATS), default="png")
+    parser.add_argument(
+        "--backend",
+        choices=("auto",) + BACKENDS,
+        default="auto",
+        help="реализация поиска границ (по умолчанию выбирается микробенчмарком)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        choices=profiling.PROFILE_MODES,
+        help="профилировать конвейер (по умолчанию cprofile)",
+    )
+    parser.add_argument("--profile-output", default="profile", help="префикс файлов профиля")
+    parser.add_argument(
+        "--profile-memory", action="store_true", help="отслеживать пик памяти tracemalloc"
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        run_pipeline_async(
+            limit=args.limit,
+            save_format=args.save_format,
+            profile=args.profile,
+            profile_output=args.profile_output,
+            profile_memory=args.profile_memory,
+            backend=args.backend,
+        )
+    )
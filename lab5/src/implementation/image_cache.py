@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class ImageCache:
+    """
+    Дисковый кэш декодированных изображений.
+
+    Пиксели хранятся в файлах <sha256 содержимого и target_size>.npy и открываются через np.load(mmap_mode="r"),
+    поэтому попадание в кэш не требует ни сети, ни декодирования JPEG. Индекс url -> запись
+    (хэш, ETag, Last-Modified, время проверки) лежит в index.json; порядок записей в нём -
+    порядок LRU. При превышении max_bytes вытесняются давно не использованные адреса.
+
+    max_age задаёт, сколько секунд запись считается свежей без обращения к серверу
+    (None - всегда, 0 - проверять каждый раз через If-None-Match / If-Modified-Since).
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, root, max_bytes: int = 1 << 30, max_age: Optional[float] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        index_path = self.root / self.INDEX_NAME
+        if index_path.exists():
+            self._entries.update(json.loads(index_path.read_text(encoding="utf-8")))
+
+    def _path(self, digest: str) -> Path:
+        return self.root / f"{digest}.npy"
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size_bytes()
+
+    def _size_bytes(self) -> int:
+        sizes = {entry["digest"]: entry["nbytes"] for entry in self._entries.values()}
+        return sum(sizes.values())
+
+    def lookup(self, url: str, target_size=None) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(url)
+            target_size = list(target_size) if target_size is not None else None
+            if (
+                entry is None
+                or entry["target_size"] != target_size
+                or not self._path(entry["digest"]).exists()
+            ):
+                self.misses += 1
+                return None
+            return dict(entry)
+
+    def is_fresh(self, entry: dict) -> bool:
+        return self.max_age is None or time.time() - entry["checked_at"] < self.max_age
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url: str, target_size=None, revalidated: bool = False) -> Optional[np.ndarray]:
+        """
+        Проверяет запись и открывает её пиксели одним действием под блокировкой, поэтому
+        запись не может быть вытеснена между проверкой и чтением. Возвращает None, если
+        записи нет, она для другого target_size или её файл пропал либо повреждён.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            target_size = list(target_size) if target_size is not None else None
+            if entry is None or entry["target_size"] != target_size:
+                self.misses += 1
+                return None
+            try:
+                pixels = np.load(self._path(entry["digest"]), mmap_mode="r")
+            except (OSError, ValueError):
+                del self._entries[url]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            if revalidated:
+                entry["checked_at"] = time.time()
+            self.hits += 1
+        return pixels
+
+    def store(self, url: str, content: bytes, pixels: np.ndarray, headers=None, target_size=None):
+        headers = headers or {}
+        digest = hashlib.sha256(content)
+        if target_size is not None:
+            # уменьшенные при декодировании пиксели не должны совпадать с полноразмерными
+            digest.update(repr(tuple(target_size)).encode())
+        digest = digest.hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(pixels))
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = {
+                "digest": digest,
+                "nbytes": path.stat().st_size,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "checked_at": time.time(),
+                "target_size": list(target_size) if target_size is not None else None,
+            }
+            self._evict()
+            self._write_index()
+
+    def _evict(self):
+        while len(self._entries) > 1 and self._size_bytes() > self.max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            if all(other["digest"] != entry["digest"] for other in self._entries.values()):
+                self._path(entry["digest"]).unlink(missing_ok=True)
+
+    def _write_index(self):
+        tmp_path = self.root / f"{self.INDEX_NAME}.tmp"
+        tmp_path.write_text(json.dumps(self._entries), encoding="utf-8")
+        os.replace(tmp_path, self.root / self.INDEX_NAME)
+
+    def flush(self):
+        with self._lock:
+            self._write_index()
@@ -1,19 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from numpy.lib._stride_tricks_impl import sliding_window_view
-from scipy import ndimage
+
+from .backends import BACKENDS, registry
+from .result_cache import ResultCache, memoized
+
+CONVOLUTION_METHODS = ("auto", "direct", "separable", "shifted", "fft")
+
+# Площадь ядра, начиная с которой свёртка через БПФ выгоднее поэлементного сложения сдвигов
+FFT_KERNEL_AREA = 121
+
+# Перекрытие плиток для углов Харриса: Собель (1) + гауссов фильтр sigma=1 (4) + максимум (1)
+HARRIS_HALO = 6
+
+# Число пикселей в полосе строк при переводе в оттенки серого: промежуточные
+# произведения каналов создаются только для полосы, а не для всего кадра
+GRAYSCALE_CHUNK_PIXELS = 1 << 16
+
+# Число голосов за центры окружностей, вычисляемых за один проход (по пачкам радиусов)
+CIRCLE_VOTE_CHUNK = 1 << 21
 
 
 class ImageProcessing:
-    def __init__(self, image_data_type=None):
+    def __init__(
+        self,
+        image_data_type=None,
+        convolution_method: str = "auto",
+        result_cache: ResultCache = None,
+        backend: str = "auto",
+    ):
+        if convolution_method not in CONVOLUTION_METHODS:
+            raise ValueError(
+                f"Unknown convolution method {convolution_method!r}, "
+                f"expected one of {CONVOLUTION_METHODS}"
+            )
+        if backend != "auto" and backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected 'auto' or one of {BACKENDS}")
         self._image_data_type = np.float32 if not image_data_type else image_data_type
+        self._convolution_method = convolution_method
+        # необязательный кэш результатов, см. memoized
+        self._result_cache = result_cache
+        self._backend = backend
+
+    def apply(self, operation: str, image: np.ndarray, backend: str = None, **params):
+        """
+        Выполняет операцию через реестр бэкендов (см. backends.registry).
+
+        Args:
+            operation: Имя операции: "edges", "corners" или "circles"
+            image: Исходное изображение
+            backend: "numpy", "scipy", "opencv" или "auto"; по умолчанию - бэкенд экземпляра
+            **params: Параметры операции (k, threshold, min_radius...)
+
+        Returns:
+            Результат выбранной реализации операции
+        """
+        return registry.run(operation, backend or self._backend, self, image, **params)
+
+    @staticmethod
+    def _separate_kernel(kernel: np.ndarray):
+        """
+        Раскладывает ядро ранга 1 на пару одномерных векторов.
+
+        Args:
+            kernel: Ядро свёртки (матрица)
+
+        Returns:
+            Кортеж (столбец, строка), такой что kernel == outer(столбец, строка),
+            либо None, если ядро не раскладывается
+        """
+        if min(kernel.shape) < 2 or not np.any(kernel):
+            return None
+        u, s, vt = np.linalg.svd(kernel.astype(np.float64))
+        if s[1] > s[0] * 1e-7:
+            return None
+        scale = np.sqrt(s[0])
+        return u[:, 0] * scale, vt[0] * scale
+
+    def _choose_convolution_method(self, kernel: np.ndarray) -> str:
+        if self._separate_kernel(kernel) is not None:
+            return "separable"
+        if kernel.size >= FFT_KERNEL_AREA:
+            return "fft"
+        return "shifted"
+
+    @staticmethod
+    def _shifted_sum(image_padded: np.ndarray, kernel: np.ndarray, dtype) -> np.ndarray:
+        """
+        Свёртка накоплением сдвинутых копий изображения, по одной на ненулевой элемент ядра.
+
+        Args:
+            image_padded: Дополненное нулями изображение (последние две оси - H и W,
+                остальные считаются пакетными)
+            kernel: Ядро свёртки (матрица)
+            dtype: Тип данных результата
+
+        Returns:
+            Изображение после применения свёртки
+        """
+        out_h = image_padded.shape[-2] - kernel.shape[0] + 1
+        out_w = image_padded.shape[-1] - kernel.shape[1] + 1
+        result = np.zeros(image_padded.shape[:-2] + (out_h, out_w), dtype=dtype)
+        buffer = np.empty_like(result)
+        for (dy, dx), weight in np.ndenumerate(kernel):
+            if weight == 0:
+                continue
+            window = image_padded[..., dy : dy + out_h, dx : dx + out_w]
+            np.multiply(window, weight, out=buffer, casting="unsafe")
+            np.add(result, buffer, out=result)
+        return result
+
+    @staticmethod
+    def _fft_convolution(image_padded: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+        from scipy import fft
+
+        kernel_h, kernel_w = kernel.shape
+        out_h = image_padded.shape[-2] - kernel_h + 1
+        out_w = image_padded.shape[-1] - kernel_w + 1
+        shape = (
+            fft.next_fast_len(image_padded.shape[-2] + kernel_h - 1, real=True),
+            fft.next_fast_len(image_padded.shape[-1] + kernel_w - 1, real=True),
+        )
+        spectrum = fft.rfft2(image_padded, shape) * fft.rfft2(kernel[::-1, ::-1], shape)
+        full = fft.irfft2(spectrum, shape)
+        return full[..., kernel_h - 1 : kernel_h - 1 + out_h, kernel_w - 1 : kernel_w - 1 + out_w]
+
+    def _convolution2d(
+        self, image: np.ndarray, kernel: np.ndarray, method: str = None
+    ) -> np.ndarray:
+        """
+        Выполняет свёртку одноканального изображения (или стопки изображений) с заданным ядром.
+
+        Стратегия выбирается по ядру: ядра ранга 1 (Собель, Гаусс) считаются двумя
+        одномерными проходами, небольшие плотные ядра - сложением сдвигов,
+        большие - через БПФ. "direct" оставляет исходную реализацию через
+        sliding_window_view.
+
+        Args:
+            image: Входное одноканальное изображение; свёртка идёт по двум последним осям,
+                все предыдущие оси считаются пакетными
+            kernel: Ядро свёртки (матрица)
+            method: Стратегия свёртки из CONVOLUTION_METHODS
+                (по умолчанию - заданная в конструкторе)
+
+        Returns:
+            Изображение после применения свёртки
+        """
+        method = method or self._convolution_method
+        if method not in CONVOLUTION_METHODS:
+            raise ValueError(
+                f"Unknown convolution method {method!r}, expected one of {CONVOLUTION_METHODS}"
+            )
 
-    def _convolution2d(self, image: np.ndarray, kernel: np.ndarray) -> np.ndarray:
         pad_h = kernel.shape[0] // 2
         pad_w = kernel.shape[1] // 2
-        image_padded = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode="constant")
-        windows = sliding_window_view(image_padded, kernel.shape)
-        result = np.sum(windows * kernel, axis=(-1, -2))
-        return result
+        pad_width = ((0, 0),) * (image.ndim - 2) + ((pad_h, pad_h), (pad_w, pad_w))
+        image_padded = np.pad(image, pad_width, mode="constant")
+        dtype = np.result_type(image.dtype, kernel.dtype)
+
+        if method == "auto":
+            method = self._choose_convolution_method(kernel)
+
+        if method == "direct":
+            windows = sliding_window_view(image_padded, kernel.shape, axis=(-2, -1))
+            return np.sum(windows * kernel, axis=(-1, -2))
+
+        if method == "shifted":
+            return self._shifted_sum(image_padded, kernel, dtype)
+
+        if method == "separable":
+            factors = self._separate_kernel(kernel)
+            if factors is None:
+                raise ValueError("Kernel is not separable (rank > 1)")
+            column, row = factors
+            work_dtype = dtype if np.issubdtype(dtype, np.floating) else np.float64
+            rows_pass = self._shifted_sum(image_padded, row[np.newaxis, :], work_dtype)
+            result = self._shifted_sum(rows_pass, column[:, np.newaxis], work_dtype)
+        else:
+            result = self._fft_convolution(image_padded, kernel)
+
+        if np.issubdtype(dtype, np.integer):
+            result = np.rint(result)
+        return result.astype(dtype, copy=False)
 
     def _convolution(self, image: np.ndarray, kernel: np.ndarray) -> np.ndarray:
         """
@@ -29,12 +198,9 @@ class ImageProcessing:
         image = image.astype(self._image_data_type)
         kernel = kernel.astype(self._image_data_type)
         if image.ndim == 3:
-            result = np.zeros_like(image, dtype=self._image_data_type)
-            for channel in range(image.shape[2]):
-                result[:, :, channel] = self._convolution2d(
-                    image=image[:, :, channel], kernel=kernel
-                )
-            return result
+            # каналы сворачиваются одним вызовом как пакетная ось
+            channels_first = np.moveaxis(image, -1, 0)
+            return np.moveaxis(self._convolution2d(image=channels_first, kernel=kernel), 0, -1)
         else:
             return self._convolution2d(image=image, kernel=kernel)
 
@@ -42,16 +208,33 @@ class ImageProcessing:
         """
         Преобразует RGB-изображение в оттенки серого.
 
+        Результат накапливается по каналам сразу в массиве типа self._image_data_type
+        (для целых типов - во float32) полосами по GRAYSCALE_CHUNK_PIXELS пикселей,
+        без временного массива float64 размером с кадр, как у np.dot.
+
         Args:
-            image: Входное RGB-изображение
+            image: Входное RGB-изображение (H, W, C) или пакет (N, H, W, C)
 
         Returns:
             Одноканальное изображение в оттенках серого
         """
-        if not weights:
-            weights = np.array([0.299, 0.587, 0.114])
-        return np.dot(image[..., :3], weights).astype(self._image_data_type)
-
+        if weights is None:
+            weights = (0.299, 0.587, 0.114)
+        dtype = np.dtype(self._image_data_type)
+        accumulate = dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float32)
+        gray = np.empty(image.shape[:-1], dtype=accumulate)
+
+        rows, width = image.shape[-3], image.shape[-2]
+        step = max(GRAYSCALE_CHUNK_PIXELS // max(width, 1), 1)
+        for start in range(0, rows, step):
+            band = gray[..., start : start + step, :]
+            pixels = image[..., start : start + step, :, :]
+            np.multiply(pixels[..., 0], weights[0], out=band)
+            for channel in (1, 2):
+                band += pixels[..., channel] * weights[channel]
+        return gray if accumulate == dtype else gray.astype(dtype)
+
+    @memoized
     def _gamma_correction(self, image: np.ndarray, gamma: float) -> np.ndarray:
         """
         Применяет гамма-коррекцию к изображению.
@@ -66,27 +249,210 @@ class ImageProcessing:
         table = (np.linspace(0, 1, 256) ** (1.0 / gamma) * 255).astype(self._image_data_type)
         return table[image]
 
-    def edge_detection(self, image: np.ndarray) -> np.ndarray:
+    @memoized
+    def edge_detection(self, image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
         """
         Выполняет обнаружение границ на изображении с использованием оператора Собеля.
 
         Args:
             image: Входное изображение (RGB)
+            out: Необязательный массив формы (H, W) для записи результата
 
         Returns:
             Одноканальное изображение с выделенными границами
         """
         gray = self._rgb_to_grayscale(image)
-        sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
-        sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+        return self._sobel_edges(gray, out=out)
+
+    def _prepare_out(self, out: np.ndarray, shape: tuple) -> np.ndarray:
+        dtype = self._image_data_type
+        if out is None:
+            return np.empty(shape, dtype=dtype)
+        if out.shape != shape or out.dtype != dtype:
+            raise ValueError(
+                f"out must have shape {shape} and dtype {np.dtype(dtype)}, "
+                f"got {out.shape} and {out.dtype}"
+            )
+        return out
+
+    def _sobel_edges(self, gray: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Считает нормированную величину градиента Собеля за один проход.
+
+        Args:
+            gray: Изображение в оттенках серого формы (H, W) или стопка формы (N, H, W)
+            out: Необязательный массив той же формы и типа self._image_data_type
+
+        Returns:
+            Величина градиента, нормированная на максимум каждого изображения к [0, 255]
+        """
+        out = self._prepare_out(out, gray.shape)
+        pad_width = ((0, 0),) * (gray.ndim - 2) + ((1, 1), (1, 1))
+        padded = np.pad(gray.astype(self._image_data_type, copy=False), pad_width, mode="constant")
+        self._sobel_magnitude(padded, out)
+
+        peak = out.max(axis=(-2, -1), keepdims=True)
+        np.multiply(out, 255 / peak, out=out)
+        return out
+
+    def _sobel_magnitude(self, padded: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Записывает в out величину градиента Собеля для изображения, дополненного на 1 пиксель.
+
+        Оба направления считаются по одной дополненной копии изображения:
+        ядра Собеля раскладываются на сглаживание [1, 2, 1] и разность [-1, 0, 1],
+        промежуточные результаты пишутся в заранее выделенные буферы (out=),
+        поэтому на кадр приходится три временных массива вместо восьми.
+        Все операции поэлементные, поэтому результат для пикселя не зависит от того,
+        считается ли кадр целиком или по плиткам.
+        """
+        grad_x, grad_y = self._sobel_gradients(padded, out)
+
+        np.multiply(grad_x, grad_x, out=out)
+        np.multiply(grad_y, grad_y, out=grad_y)
+        np.add(out, grad_y, out=out)
+        np.sqrt(out, out=out)
+        return out
+
+    def _sobel_gradients(self, padded: np.ndarray, out: np.ndarray = None):
+        """
+        Считает градиенты Собеля по x и y для изображения, дополненного на 1 пиксель.
+
+        Args:
+            padded: Изображение в оттенках серого, дополненное нулями на 1 пиксель
+            out: Необязательный буфер для grad_x формы исходного изображения
+
+        Returns:
+            Пара (grad_x, grad_y); grad_x записан в out, grad_y - представление
+            промежуточного буфера
+        """
+        dtype = self._image_data_type
+        height = padded.shape[-2] - 2
+        if out is None:
+            out = np.empty(padded.shape[:-2] + (height, padded.shape[-1] - 2), dtype=dtype)
+        left, middle, right = padded[..., :-2], padded[..., 1:-1], padded[..., 2:]
+
+        # горизонтальные проходы по всем строкам дополненного изображения
+        difference = np.subtract(right, left)
+        smoothed = np.multiply(middle, 2, dtype=dtype)
+        np.add(smoothed, left, out=smoothed)
+        np.add(smoothed, right, out=smoothed)
+
+        # вертикальные проходы: grad_x в out, grad_y в освободившийся буфер разности
+        grad_x = out
+        np.multiply(difference[..., 1:-1, :], 2, out=grad_x)
+        np.add(grad_x, difference[..., :-2, :], out=grad_x)
+        np.add(grad_x, difference[..., 2:, :], out=grad_x)
+
+        grad_y = difference[..., :height, :]
+        np.subtract(smoothed[..., 2:, :], smoothed[..., :-2, :], out=grad_y)
+        return grad_x, grad_y
+
+    @staticmethod
+    def _tiles(height: int, width: int, tile_size: int, halo: int):
+        """
+        Разбивает кадр на плитки tile_size x tile_size с перекрытием halo.
+
+        Yields:
+            Пары (плитка, плитка с перекрытием) в виде кортежей (y0, y1, x0, x1);
+            перекрытие обрезается по границам кадра
+        """
+        for y0 in range(0, height, tile_size):
+            for x0 in range(0, width, tile_size):
+                y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+                yield (y0, y1, x0, x1), (
+                    max(y0 - halo, 0),
+                    min(y1 + halo, height),
+                    max(x0 - halo, 0),
+                    min(x1 + halo, width),
+                )
+
+    @staticmethod
+    def _map_tiles(function, tiles: list, workers: int) -> list:
+        if workers <= 1:
+            return [function(*tile) for tile in tiles]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda tile: function(*tile), tiles))
+
+    @memoized
+    def edge_detection_tiled(
+        self, image: np.ndarray, tile_size: int = 1024, workers: int = 1, out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Обнаружение границ по плиткам с перекрытием в радиус ядра.
+
+        Результат побитово совпадает с edge_detection, а пиковая память на плитку
+        определяется tile_size, а не размером кадра. Плитки могут считаться
+        в нескольких потоках (NumPy отпускает GIL).
+
+        Args:
+            image: Входное изображение (RGB), в том числе np.memmap
+            tile_size: Сторона плитки в пикселях
+            workers: Число потоков
+            out: Необязательный массив формы (H, W) для результата (например, np.memmap)
+
+        Returns:
+            Одноканальное изображение с выделенными границами
+        """
+        height, width = image.shape[:2]
+        out = self._prepare_out(out, (height, width))
 
-        grad_x = self._convolution(image=gray, kernel=sobel_x)
-        grad_y = self._convolution(image=gray, kernel=sobel_y)
+        def magnitude(tile, halo_tile):
+            y0, y1, x0, x1 = tile
+            hy0, hy1, hx0, hx1 = halo_tile
+            gray = self._rgb_to_grayscale(image[hy0:hy1, hx0:hx1])
+            # на границах кадра перекрытия нет - дополняем нулями, как edge_detection
+            pad_width = ((1 - (y0 - hy0), 1 - (hy1 - y1)), (1 - (x0 - hx0), 1 - (hx1 - x1)))
+            padded = np.pad(gray, pad_width, mode="constant")
+            return self._sobel_magnitude(padded, out[y0:y1, x0:x1]).max()
 
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        tiles = list(self._tiles(height, width, tile_size, halo=1))
+        scale = 255 / max(self._map_tiles(magnitude, tiles, workers))
 
-        return (gradient_magnitude * 255 / gradient_magnitude.max()).astype(self._image_data_type)
+        def normalize(tile, _):
+            y0, y1, x0, x1 = tile
+            np.multiply(out[y0:y1, x0:x1], scale, out=out[y0:y1, x0:x1])
 
+        self._map_tiles(normalize, tiles, workers)
+        return out
+
+    def edge_detection_batch(self, images, out: np.ndarray = None):
+        """
+        Выполняет обнаружение границ сразу для пакета изображений.
+
+        Изображения одного размера обрабатываются как один тензор (N, H, W, 3):
+        перевод в оттенки серого, свёртки Собеля и величина градиента считаются
+        векторно для всей стопки. Список изображений разного размера
+        разбивается на группы по форме, каждая группа обрабатывается одним пакетом.
+
+        Args:
+            images: Массив формы (N, H, W, 3) или список RGB-изображений
+            out: Необязательный массив формы (N, H, W) для результата (только для массива,
+                для списка изображений - ValueError)
+
+        Returns:
+            Массив формы (N, H, W) для входного массива, иначе список
+            одноканальных изображений в исходном порядке
+        """
+        if isinstance(images, np.ndarray):
+            if images.ndim != 4:
+                raise ValueError(f"Expected array of shape (N, H, W, 3), got {images.shape}")
+            return self._sobel_edges(self._rgb_to_grayscale(images), out=out)
+        if out is not None:
+            raise ValueError("out is supported only for an array of shape (N, H, W, 3)")
+
+        buckets = {}
+        for position, image in enumerate(images):
+            buckets.setdefault(image.shape, []).append(position)
+
+        results = [None] * len(images)
+        for positions in buckets.values():
+            stacked = np.stack([images[position] for position in positions])
+            for position, edges in zip(positions, self.edge_detection_batch(stacked)):
+                results[position] = edges
+        return results
+
+    @memoized
     def edge_detection2(self, image: np.ndarray) -> np.ndarray:
         """
         Выполняет обнаружение границ на изображении с использованием оператора Собеля.
@@ -103,6 +469,7 @@ class ImageProcessing:
         edges = cv2.Canny(gray, 100, 200)
         return edges
 
+    @memoized
     def corner_detection(
         self, image: np.ndarray, k: float = 0.04, threshold: float = 0.01
     ) -> np.ndarray:
@@ -117,6 +484,21 @@ class ImageProcessing:
         Returns:
             Изображение с выделенными углами (красные точки)
         """
+        from scipy import ndimage
+
+        R = self._harris_response(image, k)
+
+        corners = np.zeros_like(R)
+        local_max = ndimage.maximum_filter(R, size=3) == R
+        corners[local_max & (R > threshold * R.max())] = 1  # ищем максимумы (локальные)
+
+        result = image.copy()
+        result[corners.astype(bool)] = [255, 0, 0]
+        return result
+
+    def _harris_response(self, image: np.ndarray, k: float) -> np.ndarray:
+        from scipy import ndimage
+
         gray = self._rgb_to_grayscale(image).astype(float)
 
         Ix = ndimage.sobel(gray, axis=1)  # производные
@@ -129,16 +511,75 @@ class ImageProcessing:
         det = Ixx * Iyy - Ixy**2
         trace = Ixx + Iyy
 
-        R = det - k * trace**2  # определитель харриса
+        return det - k * trace**2  # определитель харриса
+
+    @memoized
+    def corner_detection_tiled(
+        self,
+        image: np.ndarray,
+        k: float = 0.04,
+        threshold: float = 0.01,
+        tile_size: int = 1024,
+        workers: int = 1,
+        out: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Обнаружение углов Харриса по плиткам, побитово совпадающее с corner_detection.
 
-        corners = np.zeros_like(R)
-        local_max = ndimage.maximum_filter(R, size=3) == R
-        corners[local_max & (R > threshold * R.max())] = 1  # ищем максимумы (локальные)
+        Перекрытие плиток HARRIS_HALO покрывает радиусы Собеля, гауссова фильтра
+        и фильтра максимума. Порог зависит от максимума отклика по всему кадру,
+        поэтому отклик считается в два прохода: сначала максимум, затем отметка углов;
+        полный массив отклика при этом не хранится.
 
-        result = image.copy()
-        result[corners.astype(bool)] = [255, 0, 0]
-        return result
+        Args:
+            image: Входное изображение (RGB)
+            k: Коэффициент для алгоритма Харриса
+            threshold: Порог для обнаружения углов
+            tile_size: Сторона плитки в пикселях
+            workers: Число потоков
+            out: Необязательный массив формы и типа image (например, np.memmap);
+                копия изображения пишется в него по плиткам
 
+        Returns:
+            Изображение с выделенными углами (красные точки)
+        """
+        height, width = image.shape[:2]
+        tiles = list(self._tiles(height, width, tile_size, halo=HARRIS_HALO))
+        if out is None:
+            out = np.empty_like(image)
+        elif out.shape != image.shape or out.dtype != image.dtype:
+            raise ValueError(
+                f"out must have shape {image.shape} and dtype {image.dtype}, "
+                f"got {out.shape} and {out.dtype}"
+            )
+
+        from scipy import ndimage
+
+        def inner(tile, halo_tile):
+            y0, y1, x0, x1 = tile
+            hy0, _, hx0, _ = halo_tile
+            return slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0)
+
+        def response_max(tile, halo_tile):
+            hy0, hy1, hx0, hx1 = halo_tile
+            R = self._harris_response(image[hy0:hy1, hx0:hx1], k)
+            return R[inner(tile, halo_tile)].max()
+
+        limit = threshold * max(self._map_tiles(response_max, tiles, workers))
+
+        def mark_corners(tile, halo_tile):
+            y0, y1, x0, x1 = tile
+            hy0, hy1, hx0, hx1 = halo_tile
+            R = self._harris_response(image[hy0:hy1, hx0:hx1], k)
+            local_max = ndimage.maximum_filter(R, size=3) == R
+            corners = (local_max & (R > limit))[inner(tile, halo_tile)]
+            out[y0:y1, x0:x1] = image[y0:y1, x0:x1]
+            out[y0:y1, x0:x1][corners] = [255, 0, 0]
+
+        self._map_tiles(mark_corners, tiles, workers)
+        return out
+
+    @memoized
     def corner_detection2(self, image: np.ndarray) -> np.ndarray:
         """
         Выполняет обнаружение углов на изображении.
@@ -162,16 +603,249 @@ class ImageProcessing:
         result[dst > 0.01 * dst.max()] = [255, 0, 0]
         return result
 
-    def circle_detection(self, image: np.ndarray) -> np.ndarray:
+    @memoized
+    def circle_detection(self, image: np.ndarray, **params) -> np.ndarray:
+        """
+        Выполняет обнаружение окружностей преобразованием Хафа по градиенту.
+
+        Args:
+            image: Входное изображение (RGB)
+            **params: Параметры detect_circles
+
+        Returns:
+            Изображение с выделенными окружностями (красные контуры)
         """
-        Заглушка для обнаружения окружностей. Требует сложной реализации.
+        return self.draw_circles(image, self.detect_circles(image, **params))
+
+    def detect_circles(
+        self,
+        image: np.ndarray,
+        min_radius: int = 5,
+        max_radius: int = None,
+        dp: int = 1,
+        min_dist: float = None,
+        edge_threshold: float = 0.25,
+        min_score: float = 0.5,
+        max_circles: int = 50,
+        blur_sigma: float = 1.5,
+    ) -> np.ndarray:
+        """
+        Находит окружности методом Хафа по градиенту.
+
+        Каждая граничная точка (градиент Собеля размытого изображения выше edge_threshold
+        от максимума)
+        голосует только вдоль направления своего градиента, в обе стороны, для радиусов
+        [min_radius, max_radius]. Голоса копятся в двумерном аккумуляторе центров
+        с шагом dp вместо куба H x W x R. Для локальных максимумов аккумулятора центр
+        уточняется локальным поиском, а радиус выбирается по второму, точному проходу:
+        доле окружности, покрытой граничными точками на этом расстоянии от центра.
 
         Args:
             image: Входное изображение (RGB)
+            min_radius: Минимальный радиус
+            max_radius: Максимальный радиус (по умолчанию - половина меньшей стороны)
+            dp: Шаг аккумулятора центров в пикселях
+            min_dist: Минимальное расстояние между центрами (по умолчанию - min_radius)
+            edge_threshold: Порог граничных точек, доля от максимума градиента
+            min_score: Минимальная доля окружности, подтверждённая граничными точками
+            max_circles: Максимальное число окружностей
+            blur_sigma: Размытие по Гауссу перед вычислением градиента (0 - без размытия)
+
+        Returns:
+            Массив формы (N, 4) со строками (x, y, r, score), отсортированный по score
+        """
+        from scipy import ndimage
+
+        height, width = image.shape[:2]
+        max_radius = max_radius or min(height, width) // 2
+        min_dist = min_dist or min_radius
+        empty = np.empty((0, 4), dtype=np.float64)
+
+        points = self._circle_edges(image, edge_threshold, blur_sigma)
+        if not points[0].size or max_radius < min_radius:
+            return empty
+        xs, ys, _, dir_x, dir_y = points
+
+        # голосование вдоль градиента пачками радиусов: один bincount на пачку, а не на
+        # каждый радиус, и не больше CIRCLE_VOTE_CHUNK голосов в памяти одновременно
+        acc_h, acc_w = -(-height // dp), -(-width // dp)
+        accumulator = np.zeros(acc_h * acc_w, dtype=np.int64)
+        # +0.5 и отбрасывание дробной части округляют координаты внутри аккумулятора
+        xs_dp, ys_dp = (xs / dp + 0.5).astype(np.float32), (ys / dp + 0.5).astype(np.float32)
+        dir_x_dp, dir_y_dp = (dir_x / dp).astype(np.float32), (dir_y / dp).astype(np.float32)
+        radii = np.arange(min_radius, max_radius + 1, dtype=np.float32)
+        radii = np.concatenate((radii, -radii))[:, None]
+        step = max(CIRCLE_VOTE_CHUNK // xs.size, 1)
+        for start in range(0, radii.shape[0], step):
+            chunk = radii[start : start + step]
+            vote_x, vote_y = xs_dp + chunk * dir_x_dp, ys_dp + chunk * dir_y_dp
+            inside = (vote_x >= 0) & (vote_x < acc_w) & (vote_y >= 0) & (vote_y < acc_h)
+            index = vote_y[inside].astype(np.intp) * acc_w + vote_x[inside].astype(np.intp)
+            accumulator += np.bincount(index, minlength=accumulator.size)
+        # голоса дальних точек расходятся из-за шума направления, поэтому аккумулятор сглаживается
+        accumulator = ndimage.gaussian_filter(
+            accumulator.reshape(acc_h, acc_w).astype(np.float32), sigma=2
+        )
+
+        # кандидаты - локальные максимумы, набравшие голоса хотя бы доли min_score граничных
+        # точек наименьшей окружности (2 pi min_radius); сглаживание размывает пик окружности
+        # примерно настолько же, насколько его поднимает толщина границы в несколько пикселей
+        min_votes = min_score * 2 * np.pi * min_radius
+        window = max(3, int(min_dist / dp) | 1)
+        peaks = (ndimage.maximum_filter(accumulator, size=window) == accumulator) & (
+            accumulator >= min_votes
+        )
+        cand_y, cand_x = np.nonzero(peaks)
+        order = np.argsort(accumulator[cand_y, cand_x])[::-1][: max_circles * 4]
+        candidates = zip(cand_x[order] * dp, cand_y[order] * dp)
+        return self._select_circles(
+            points, candidates, min_radius, max_radius, min_dist, min_score, max_circles, dp + 2
+        )
+
+    def _select_circles(
+        self,
+        points,
+        candidates,
+        min_radius: int,
+        max_radius: int,
+        min_dist: float,
+        min_score: float,
+        max_circles: int,
+        steps: int,
+    ) -> np.ndarray:
+        """
+        Отбирает окружности среди центров-кандидатов, упорядоченных по убыванию голосов.
+
+        Для каждого кандидата подбирается радиус, центр уточняется локальным поиском.
+        Кандидаты ближе min_dist к центру принятой окружности отбрасываются, как и
+        близкие к ней окружности: наибольшее расстояние между окружностями (сдвиг центра
+        плюс разность радиусов) меньше половины радиуса. Толстая граница подтверждает
+        и сдвинутые окружности, касающиеся её изнутри.
+
+        Returns:
+            Массив формы (N, 4) со строками (x, y, r, score), отсортированный по score
+        """
+
+        def is_near(x0, y0, r0=None):
+            for x, y, r, _ in circles:
+                distance = np.hypot(x0 - x, y0 - y)
+                if distance < min_dist or (r0 is not None and distance + abs(r0 - r) < r / 2):
+                    return True
+            return False
+
+        circles = []
+        for cx, cy in candidates:
+            if is_near(cx, cy):
+                continue
+            radius, score, _ = self._fit_radius(points, cx, cy, min_radius, max_radius)
+            if score < min_score / 2:
+                continue
+            cx, cy, radius, score = self._refine_circle(
+                points, cx, cy, min_radius, max_radius, steps=steps
+            )
+            if score >= min_score and not is_near(cx, cy, radius):
+                circles.append((cx, cy, radius, score))
+            if len(circles) == max_circles:
+                break
+
+        if not circles:
+            return np.empty((0, 4), dtype=np.float64)
+        circles = np.array(circles, dtype=np.float64)
+        return circles[np.argsort(circles[:, 3])[::-1]]
+
+    def _circle_edges(self, image: np.ndarray, edge_threshold: float, blur_sigma: float):
+        """
+        Граничные точки для поиска окружностей.
 
         Returns:
-            Исходное изображение без изменений
+            Массивы (x, y, величина градиента, cos и sin направления градиента)
+        """
+        from scipy import ndimage
+
+        gray = self._rgb_to_grayscale(image)
+        if blur_sigma:
+            gray = ndimage.gaussian_filter(gray, sigma=blur_sigma)
+        grad_x, grad_y = self._sobel_gradients(np.pad(gray, 1, mode="constant"))
+        magnitude = np.hypot(grad_x, grad_y)
+        threshold = edge_threshold * magnitude.max()
+
+        ys, xs = np.nonzero((magnitude > threshold) & (magnitude > 0))
+        norm = magnitude[ys, xs]
+        return xs, ys, norm, grad_x[ys, xs] / norm, grad_y[ys, xs] / norm
+
+    def _refine_circle(self, points, cx, cy, min_radius: int, max_radius: int, steps: int):
+        """
+        Сдвигает центр к соседнему пикселю, пока оценка окружности растёт.
         """
-        # Реализация обнаружения окружностей требует преобразования Хафа
-        # и является вычислительно сложной операцией
-        return image.copy()
+        radius, score, strength = self._fit_radius(points, cx, cy, min_radius, max_radius)
+        for _ in range(steps):
+            best = (strength, score, cx, cy, radius)
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if dx or dy:
+                        r, sc, st = self._fit_radius(
+                            points, cx + dx, cy + dy, min_radius, max_radius
+                        )
+                        best = max(best, (st, sc, cx + dx, cy + dy, r))
+            if best[0] <= strength:
+                break
+            strength, score, cx, cy, radius = best
+        return int(cx), int(cy), radius, score
+
+    @staticmethod
+    def _fit_radius(points, cx, cy, min_radius: int, max_radius: int):
+        """
+        Подбирает радиус окружности с центром (cx, cy) по граничным точкам.
+
+        Окружность каждого целого радиуса делится на угловые секторы (по одному на пиксель
+        длины); покрытие - доля секторов, где есть граничная точка на этом расстоянии
+        с градиентом, направленным вдоль радиуса (отклонение меньше 45 градусов): дуги
+        других контуров, пересекающие окружность, её не покрывают.
+        Радиус выбирается по максимуму произведения покрытия на среднюю величину
+        градиента вдоль окружности.
+
+        Args:
+            points: Массивы (x, y, величина градиента, cos, sin направления) граничных точек
+
+        Returns:
+            Тройка (радиус, покрытие окружности, оценка радиуса)
+        """
+        xs, ys, weights, dir_x, dir_y = points
+        near = (np.abs(xs - cx) <= max_radius + 1) & (np.abs(ys - cy) <= max_radius + 1)
+        dx, dy = xs[near] - cx, ys[near] - cy
+        distance = np.hypot(dx, dy)
+        offset = np.rint(distance).astype(np.intp) - min_radius
+        radial = np.abs(dx * dir_x[near] + dy * dir_y[near]) >= np.sqrt(0.5) * distance
+        valid = (offset >= 0) & (offset <= max_radius - min_radius) & radial
+        if not valid.any():
+            return 0, 0.0, 0.0
+        offset, dx, dy, weights = offset[valid], dx[valid], dy[valid], weights[near][valid]
+
+        radii = np.arange(min_radius, max_radius + 1)
+        sectors = np.ceil(2 * np.pi * np.maximum(radii, 1)).astype(np.intp)
+        angle = (np.arctan2(dy, dx) + np.pi) / (2 * np.pi)
+        sector = np.minimum((angle * sectors[offset]).astype(np.intp), sectors[offset] - 1)
+        # занятые секторы считаются по уникальным парам (радиус, сектор), без плотной
+        # таблицы радиусов на секторы
+        keys = np.sort(offset * sectors[-1] + sector)
+        covered = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] // sectors[-1]
+
+        coverage = np.bincount(covered, minlength=radii.size) / sectors
+        strength = coverage * np.bincount(offset, weights=weights, minlength=radii.size) / sectors
+        best = int(np.argmax(strength))
+        return int(radii[best]), float(coverage[best]), float(strength[best])
+
+    @staticmethod
+    def draw_circles(image: np.ndarray, circles: np.ndarray, color=(255, 0, 0)) -> np.ndarray:
+        """
+        Рисует окружности (x, y, r, score) на копии изображения.
+        """
+        result = image.copy()
+        height, width = image.shape[:2]
+        for x, y, radius, _ in circles:
+            angles = np.linspace(0, 2 * np.pi, max(int(2 * np.pi * radius) * 2, 8), endpoint=False)
+            px = np.rint(x + radius * np.cos(angles)).astype(np.intp)
+            py = np.rint(y + radius * np.sin(angles)).astype(np.intp)
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            result[py[inside], px[inside]] = color
+        return result
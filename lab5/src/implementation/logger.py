@@ -1,39 +1,270 @@
+import atexit
+import inspect
 import logging
+import multiprocessing
+import queue
+import random
+import threading
 import time
-from functools import wraps
+from functools import partial, wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from .metrics import MetricsRegistry, registry
+
+LOGGER_NAME = "pipeline_logger"
+LOG_FILE = "app.log"
+LOG_MAX_BYTES = 10 << 20
+LOG_BACKUP_COUNT = 3
+
+_config_lock = threading.Lock()
+# слушатель очереди записей этого процесса и, при наличии пула процессов, очереди рабочих
+_listener = None
+_worker_queue = None
+_worker_listener = None
+_is_worker = False
+
+
+def _make_handlers(log_file: str, max_bytes: int, backup_count: int) -> list:
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+    )
+    file_handler.setFormatter(file_formatter)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    console_handler.setFormatter(console_formatter)
+    return [file_handler, console_handler]
+
+
+def configure_logging(
+    log_file: str = LOG_FILE,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
+) -> logging.Logger:
+    """
+    Настраивает логгер конвейера один раз на процесс; повторные вызовы ничего не меняют.
+
+    Логгер получает только QueueHandler: вызов logger.info кладёт запись в очередь,
+    а форматирование и запись в файл (RotatingFileHandler, не больше max_bytes
+    на файл и backup_count старых файлов) и в консоль выполняет фоновый поток QueueListener.
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _config_lock:
+        if _listener is not None or _is_worker:
+            return logger
+        log_queue = queue.SimpleQueue()
+        handlers = _make_handlers(log_file, max_bytes, backup_count)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        logger.setLevel(logging.DEBUG)
+        logger.handlers.clear()
+        logger.addHandler(QueueHandler(log_queue))
+    return logger
+
+
+def worker_log_queue():
+    """
+    Очередь, через которую рабочие процессы пула передают записи этому процессу.
+
+    Создаётся при первом вызове вместе со своим слушателем, который пишет в те же
+    обработчики. Возвращает None, если логирование в этом процессе не настроено.
+    """
+    global _worker_queue, _worker_listener
+    with _config_lock:
+        if _listener is None:
+            return None
+        if _worker_queue is None:
+            _worker_queue = multiprocessing.Queue()
+            _worker_listener = QueueListener(
+                _worker_queue, *_listener.handlers, respect_handler_level=True
+            )
+            _worker_listener.start()
+        return _worker_queue
+
+
+def configure_worker_logging(log_queue):
+    """
+    Вызывается в инициализаторе рабочего процесса: все записи уходят в log_queue
+    родителя, собственные файлы и слушатели рабочий не открывает.
+    """
+    global _is_worker, _listener, _worker_queue, _worker_listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _config_lock:
+        # при fork процесс наследует состояние родителя, но не его потоки
+        _is_worker = True
+        _listener = _worker_queue = _worker_listener = None
+        logger.setLevel(logging.DEBUG)
+        logger.handlers.clear()
+        if log_queue is not None:
+            logger.addHandler(QueueHandler(log_queue))
+
+
+def stop_logging():
+    """Дописывает очереди, закрывает обработчики и снимает настройку логгера."""
+    global _listener, _worker_queue, _worker_listener
+    with _config_lock:
+        listeners = [_listener, _worker_listener]
+        handlers = _listener.handlers if _listener is not None else ()
+        _listener = _worker_queue = _worker_listener = None
+        if listeners[0] is not None:
+            logging.getLogger(LOGGER_NAME).handlers.clear()
+    for listener in listeners:
+        if listener is not None:
+            listener.stop()
+    for handler in handlers:
+        handler.close()
+
+
+atexit.register(stop_logging)
+
+
+class _Timing:
+    """Параметры замера одной функции, общие для обёрток timeit."""
+
+    def __init__(self, name: str, sample_rate: float, metrics: MetricsRegistry, logger):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.metrics = metrics
+        self.logger = logger
+
+    def sampled(self) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> int:
+        if self.logger is not None:
+            self.logger.info(f"Starting '{self.name}'...")
+        return time.perf_counter_ns()
+
+    def finish(self, start: int):
+        elapsed = time.perf_counter_ns() - start
+        self.metrics.observe(self.name, elapsed)
+        if self.logger is not None:
+            self.logger.info(f"Finished '{self.name}' in {elapsed / 1e9: .3f}s")
+
+
+def _wrap_function(func, timing: _Timing):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not timing.sampled():
+            return func(*args, **kwargs)
+        start = timing.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timing.finish(start)
+
+    return wrapper
+
+
+def _wrap_coroutine(func, timing: _Timing):
+    @wraps(func)
+    async def async_wrapper(*args, **kwargs):
+        if not timing.sampled():
+            return await func(*args, **kwargs)
+        start = timing.start()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timing.finish(start)
+
+    return async_wrapper
+
+
+def _wrap_generator(func, timing: _Timing):
+    @wraps(func)
+    def gen_wrapper(*args, **kwargs):
+        if not timing.sampled():
+            return (yield from func(*args, **kwargs))
+        start = timing.start()
+        try:
+            return (yield from func(*args, **kwargs))
+        finally:
+            timing.finish(start)
+
+    return gen_wrapper
+
+
+def _wrap_async_generator(func, timing: _Timing):
+    @wraps(func)
+    async def async_gen_wrapper(*args, **kwargs):
+        start = timing.start() if timing.sampled() else None
+        try:
+            async for item in func(*args, **kwargs):
+                yield item
+        finally:
+            if start is not None:
+                timing.finish(start)
+
+    return async_gen_wrapper
+
+
+def timeit(
+    func=None,
+    *,
+    name: str = None,
+    sample_rate: float = 1.0,
+    metrics: MetricsRegistry = None,
+    logger: logging.Logger = None,
+):
+    """
+    Замеряет длительность вызовов обычной, асинхронной или генераторной функции.
+
+    Длительность (time.perf_counter_ns) записывается в гистограмму name (по умолчанию
+    __qualname__ функции) реестра metrics (по умолчанию общий metrics.registry), а не
+    в лог. sample_rate - доля замеряемых вызовов: остальные выполняются без замера.
+    Для генераторов замеряется время от первого next до исчерпания или закрытия.
+    Если задан logger, начало и конец каждого замеренного вызова пишутся в лог.
+
+    Применяется как @timeit или @timeit(sample_rate=0.1).
+    """
+    if func is None:
+        return partial(timeit, name=name, sample_rate=sample_rate, metrics=metrics, logger=logger)
+
+    timing = _Timing(name or func.__qualname__, sample_rate, metrics or registry, logger)
+    if inspect.isasyncgenfunction(func):
+        return _wrap_async_generator(func, timing)
+    if inspect.iscoroutinefunction(func):
+        return _wrap_coroutine(func, timing)
+    if inspect.isgeneratorfunction(func):
+        return _wrap_generator(func, timing)
+    return _wrap_function(func, timing)
 
 
 class PipelineLogger:
-    def __init__(self):
-        self.logger = logging.getLogger("pipeline_logger")
-        self.logger.setLevel(logging.DEBUG)
-
-        file_handler = logging.FileHandler("app.log")
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+    def __init__(self, metrics: MetricsRegistry = None, log_file: str = LOG_FILE):
+        # обработчики настраиваются при первом создании, последующие экземпляры их не трогают
+        self.logger = configure_logging(log_file)
+
+        # гистограммы стадий и счётчики, по умолчанию общий реестр процесса
+        self.metrics = metrics or registry
+
+    def log_metrics(self):
+        snapshot = self.metrics.snapshot()
+        for stage, summary in snapshot["stages"].items():
+            self.logger.info(
+                f"Stage '{stage}': n={summary['count']} p50={summary['p50_s'] * 1000:.1f}ms "
+                f"p95={summary['p95_s'] * 1000:.1f}ms p99={summary['p99_s'] * 1000:.1f}ms"
+            )
+        for counter, value in snapshot["counters"].items():
+            self.logger.info(f"Counter '{counter}': {value:g}")
+
+    def timeit(self, func=None, *, name: str = None, sample_rate: float = 1.0, log: bool = False):
+        """
+        timeit с реестром этого логгера; log=True дополнительно пишет начало и конец вызова.
+        """
+        return timeit(
+            func,
+            name=name,
+            sample_rate=sample_rate,
+            metrics=self.metrics,
+            logger=self.logger if log else None,
         )
-        file_handler.setFormatter(file_formatter)
-
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        console_handler.setFormatter(console_formatter)
-
-        self.logger.handlers.clear()
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-
-    def timeit(self, func):
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            self.logger.info(f"Starting '{func.__name__}'...")
-            start = time.time()
-            try:
-                result = await func(*args, **kwargs)
-            finally:
-                end = time.time()
-                self.logger.info(f"Finished '{func.__name__}' in {(end - start): .3f}s")
-            return result
-
-        return async_wrapper
@@ -0,0 +1,174 @@
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class ResultCache:
+    """
+    Кэш результатов методов ImageProcessing.
+
+    Ключ - хэш буфера входного массива (blake2b), его форма и тип, имя метода и значения
+    параметров (k, threshold, gamma...). В памяти хранится LRU с бюджетом max_bytes,
+    необязательный дисковый уровень disk_dir хранит результаты в .npy - тоже LRU,
+    с бюджетом max_disk_bytes; файлы, оставшиеся от прошлых запусков, учитываются
+    в порядке времени изменения.
+    Все возвращаемые массивы доступны только для чтения, поэтому копировать их при
+    выдаче не нужно.
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20, disk_dir=None, max_disk_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._disk_size = 0
+        self._disk_entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.disk_dir.glob("*.npy"), key=lambda path: path.stat().st_mtime)
+            for path in files:
+                self._disk_entries[path.stem] = path.stat().st_size
+                self._disk_size += self._disk_entries[path.stem]
+
+    @staticmethod
+    def make_key(name: str, image: np.ndarray, params: dict) -> str:
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(image.view(np.uint8).reshape(-1), digest_size=16)
+        digest.update(f"{image.shape}{image.dtype.str}".encode())
+        # порядок параметров и вид значения (0.04 или np.float32(0.04), список или кортеж)
+        # не должны менять ключ
+        params = sorted((param, _normalize(value)) for param, value in params.items())
+        digest.update(f"{name}{params!r}".encode())
+        return digest.hexdigest()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    @property
+    def disk_size_bytes(self) -> int:
+        return self._disk_size
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        if self.disk_dir is not None:
+            with self._lock:
+                result = self._load(key)
+                if result is not None:
+                    self._disk_entries.move_to_end(key)
+                    self.disk_hits += 1
+            if result is not None:
+                self._remember(key, result)
+                return result
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: np.ndarray) -> np.ndarray:
+        result.setflags(write=False)
+        self._remember(key, result)
+        if self.disk_dir is not None:
+            path = self.disk_dir / f"{key}.npy"
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, result)
+            os.replace(tmp_path, path)
+            nbytes = path.stat().st_size
+            with self._lock:
+                self._disk_size += nbytes - self._disk_entries.pop(key, 0)
+                self._disk_entries[key] = nbytes
+                self._evict_disk()
+        return result
+
+    def _load(self, key: str) -> Optional[np.ndarray]:
+        if key not in self._disk_entries:
+            return None
+        try:
+            return np.load(self.disk_dir / f"{key}.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            self._disk_size -= self._disk_entries.pop(key)
+            return None
+
+    def _evict_disk(self):
+        while len(self._disk_entries) > 1 and self._disk_size > self.max_disk_bytes:
+            key, nbytes = self._disk_entries.popitem(last=False)
+            self._disk_size -= nbytes
+            (self.disk_dir / f"{key}.npy").unlink(missing_ok=True)
+
+    def _remember(self, key: str, result: np.ndarray):
+        if result.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self._size += result.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def _normalize(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+def memoized(method):
+    """
+    Кэширует результат метода ImageProcessing в self._result_cache, если он задан.
+
+    Вызовы с out (по имени или позиционно) выполняются без кэша: результат должен оказаться в буфере вызывающего.
+    """
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def wrapper(self, image, *args, **kwargs):
+        cache = getattr(self, "_result_cache", None)
+        if cache is None:
+            return method(self, image, *args, **kwargs)
+
+        bound = signature.bind(self, image, *args, **kwargs)
+        if bound.arguments.get("out") is not None:
+            return method(self, image, *args, **kwargs)
+        bound.apply_defaults()
+        params = {
+            name: value
+            for name, value in bound.arguments.items()
+            if name not in ("self", "image", "out")
+        }
+        params["dtype"] = np.dtype(self._image_data_type).str
+        key = cache.make_key(method.__name__, image, params)
+
+        result = cache.get(key)
+        if result is None:
+            result = cache.put(key, method(self, image, *args, **kwargs))
+        return result
+
+    return wrapper
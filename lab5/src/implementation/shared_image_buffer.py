@@ -0,0 +1,73 @@
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy as np
+
+
+class SharedImageBuffer:
+    """
+    Массив NumPy, размещённый в сегменте multiprocessing.shared_memory.
+
+    Процесс-владелец создаёт сегмент через create/from_array и отвечает за unlink;
+    рабочие процессы получают только spec (имя, форма, тип) и подключаются через attach.
+    """
+
+    def __init__(self, segment: shared_memory.SharedMemory, shape, dtype, owner: bool):
+        self._segment = segment
+        self._owner = owner
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._array = np.ndarray(self.shape, dtype=self.dtype, buffer=segment.buf)
+
+    @classmethod
+    def create(cls, shape, dtype) -> "SharedImageBuffer":
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        return cls(segment, shape, dtype, owner=True)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "SharedImageBuffer":
+        buffer = cls.create(array.shape, array.dtype)
+        buffer.array[...] = array
+        return buffer
+
+    @classmethod
+    def attach(cls, name: str, shape, dtype) -> "SharedImageBuffer":
+        segment = shared_memory.SharedMemory(name=name)
+        return cls(segment, shape, dtype, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._segment.name
+
+    @property
+    def spec(self) -> Tuple[str, tuple, str]:
+        return self.name, self.shape, self.dtype.str
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            raise ValueError(f"Shared buffer {self.name} is closed")
+        return self._array
+
+    def close(self):
+        if self._array is None:
+            return
+        # сегмент нельзя закрыть, пока на его память ссылается ndarray
+        self._array = None
+        self._segment.close()
+
+    def unlink(self):
+        if self._owner:
+            self._owner = False
+            try:
+                self._segment.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        self.unlink()
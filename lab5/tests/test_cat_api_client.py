@@ -1,7 +1,23 @@
+import asyncio
+import tempfile
 import unittest
+from io import BytesIO
 from unittest.mock import AsyncMock, patch
 
-from implementation.cat_api_client import CatAPIClient
+import aiohttp
+import numpy as np
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from PIL import Image
+
+from implementation.cat_api_client import CatAPIClient, decode_image
+from implementation.image_cache import ImageCache
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 class TestCatAPIClient(unittest.IsolatedAsyncioTestCase):
@@ -17,6 +33,174 @@ class TestCatAPIClient(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(result[0]["url"], "test_cat.jpg")
 
+    def test_decode_image_draft(self):
+        """Уменьшенное декодирование JPEG до целевого размера"""
+        buffer = BytesIO()
+        Image.new("RGB", (400, 300), (200, 100, 50)).save(buffer, format="JPEG")
+
+        full = decode_image(buffer.getvalue())
+        reduced = decode_image(buffer.getvalue(), target_size=(100, 75))
+
+        self.assertEqual(full.shape, (300, 400, 3))
+        self.assertEqual(reduced.shape, (75, 100, 3))
+
+
+class TestCatAPIClientServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.image = np.random.default_rng(0).integers(0, 256, (6, 5, 3), dtype=np.uint8)
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def handle_image(request):
+            self.connections.add(request.transport.get_extra_info("peername"))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return web.Response(body=encode_png(self.image), content_type="image/png")
+
+        self.requests = {}
+
+        async def handle_flaky(request):
+            # первые два запроса к каждому адресу отвечают 503, первый /slow висит
+            name = request.match_info["name"]
+            self.requests[name] = self.requests.get(name, 0) + 1
+            if name.startswith("flaky") and self.requests[name] <= 2:
+                return web.Response(status=503)
+            if name.startswith("slow") and self.requests[name] == 1:
+                await asyncio.sleep(1)
+            if name.startswith("missing"):
+                return web.Response(status=404)
+            if name.startswith("etag"):
+                if request.headers.get("If-None-Match") == '"v1"':
+                    return web.Response(status=304)
+                return web.Response(
+                    body=encode_png(self.image), content_type="image/png", headers={"ETag": '"v1"'}
+                )
+            return web.Response(body=encode_png(self.image), content_type="image/png")
+
+        app = web.Application()
+        app.router.add_get("/cat/{index}.png", handle_image)
+        app.router.add_get("/flaky/{name}", handle_flaky)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_session_reuses_connections(self):
+        """Один пул соединений и ограничение числа одновременных запросов"""
+        urls = [(str(self.server.make_url(f"/cat/{i}.png")), i) for i in range(12)]
+
+        async with CatAPIClient(max_concurrency=3) as client:
+            images = await client.download_images(urls)
+
+        self.assertEqual([image.index for image in images], list(range(12)))
+        np.testing.assert_array_equal(images[0].image, self.image)
+        self.assertLessEqual(self.max_in_flight, 3)
+        self.assertLessEqual(len(self.connections), 3)
+        self.assertEqual(client.metrics.histogram("download").count, 12)
+        self.assertEqual(client.metrics.histogram("decode").count, 12)
+        self.assertGreater(client.metrics.counter("bytes_downloaded"), 0)
+
+    async def test_latency_excludes_queueing(self):
+        """Задержка загрузки не включает ожидание свободного слота"""
+        urls = [(str(self.server.make_url(f"/cat/{i}.png")), i) for i in range(10)]
+
+        async with CatAPIClient(max_concurrency=1) as client:
+            started = asyncio.get_running_loop().time()
+            await client.download_images(urls)
+            elapsed = asyncio.get_running_loop().time() - started
+
+        latencies = [stats.latency for stats in client.download_stats.values()]
+        self.assertLess(max(latencies), elapsed / 2)
+
+    async def test_lazy_decode(self):
+        """С lazy_decode изображение декодируется только при обращении к image"""
+        async with CatAPIClient(lazy_decode=True) as client:
+            image = await client.download_image(str(self.server.make_url("/cat/1.png")), 1)
+
+        self.assertFalse(image.is_decoded)
+        self.assertEqual(image.shape, self.image.shape)
+        np.testing.assert_array_equal(image.image, self.image)
+
+    async def test_retries_server_errors(self):
+        """Повтор при 5xx и статистика по адресу"""
+        url = str(self.server.make_url("/flaky/flaky1"))
+
+        async with CatAPIClient(backoff_base=0.001) as client:
+            image = await client.download_image(url, 1)
+
+        np.testing.assert_array_equal(image.image, self.image)
+        stats = client.download_stats[url]
+        self.assertEqual((stats.attempts, stats.failures, stats.succeeded), (3, 2, True))
+
+    async def test_client_errors_not_retried(self):
+        """4xx не повторяется"""
+        url = str(self.server.make_url("/flaky/missing"))
+
+        async with CatAPIClient(backoff_base=0.001) as client:
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await client.download_image(url, 1)
+
+        self.assertEqual(client.download_stats[url].attempts, 1)
+        self.assertFalse(client.download_stats[url].succeeded)
+
+    async def test_timeout_then_retry(self):
+        """Зависший запрос прерывается по таймауту и повторяется"""
+        url = str(self.server.make_url("/flaky/slow1"))
+
+        async with CatAPIClient(timeout=0.2, backoff_base=0.001) as client:
+            await client.download_image(url, 1)
+
+        self.assertEqual(client.download_stats[url].attempts, 2)
+
+    async def test_hedged_request(self):
+        """Хеджированный запрос обгоняет медленный"""
+        async with CatAPIClient(hedge_percentile=90, hedge_min_samples=3) as client:
+            for i in range(3):
+                await client.download_image(str(self.server.make_url(f"/cat/{i}.png")), i)
+
+            url = str(self.server.make_url("/flaky/slow2"))
+            started = asyncio.get_running_loop().time()
+            await client.download_image(url, 3)
+            elapsed = asyncio.get_running_loop().time() - started
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(client.download_stats[url].hedged, 1)
+        self.assertEqual(client.download_stats[url].attempts, 1)
+
+    async def test_cache_hit_and_revalidation(self):
+        """Свежая запись не требует сети, устаревшая проверяется через ETag"""
+        url = str(self.server.make_url("/flaky/etag1"))
+        with tempfile.TemporaryDirectory() as tmp:
+            async with CatAPIClient(cache=ImageCache(tmp)) as client:
+                first = await client.download_image(url, 1)
+                second = await client.download_image(url, 1)
+            self.assertEqual(self.requests["etag1"], 1)
+
+            async with CatAPIClient(cache=ImageCache(tmp, max_age=0)) as client:
+                third = await client.download_image(url, 1)
+            self.assertEqual(self.requests["etag1"], 2)
+
+            for image in (first, second, third):
+                np.testing.assert_array_equal(image.image, self.image)
+            self.assertEqual(client.cache.hits, 1)
+
+    async def test_cache_file_lost_after_revalidation(self):
+        """Если файл записи не читается, ответ 304 приводит к повторной загрузке без ETag"""
+        url = str(self.server.make_url("/flaky/etag2"))
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp, max_age=0)
+            async with CatAPIClient(cache=cache) as client:
+                await client.download_image(url, 1)
+                cache._path(cache.lookup(url)["digest"]).write_bytes(b"broken")
+                image = await client.download_image(url, 1)
+
+        np.testing.assert_array_equal(image.image, self.image)
+        self.assertEqual(self.requests["etag2"], 3)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,11 @@
+import pickle
+import tempfile
 import unittest
+from io import BytesIO
+from pathlib import Path
 
 import numpy as np
+from PIL import Image
 
 from implementation.cat_image import CatImage
 from implementation.image_processing import ImageProcessing
@@ -17,6 +22,99 @@ class TestCatImage(unittest.TestCase):
         self.assertIsInstance(result, CatImage)
         np.testing.assert_array_equal(result.image, np.array([[2, 4, 6], [6, 8, 10]]))
 
+    def test_saturating_arithmetic(self):
+        """uint8 насыщается вместо переполнения, url сохраняется"""
+        img1 = CatImage(image=np.array([[250, 10]], dtype=np.uint8), url="a.jpg")
+        img2 = CatImage(image=np.array([[10, 20]], dtype=np.uint8))
+
+        np.testing.assert_array_equal((img1 + img2).image, [[255, 30]])
+        np.testing.assert_array_equal((img1 - img2).image, [[240, 0]])
+        self.assertEqual((img1 + img2).image.dtype, np.uint8)
+        self.assertEqual((img1 - img2).url, "a.jpg")
+
+    def test_inplace_broadcast(self):
+        """Одноканальная карта вычитается из RGB на месте, без нового массива"""
+        rgb = np.full((2, 3, 3), 100, dtype=np.uint8)
+        edges = np.array([[0, 50.5, 300], [1, 2, 3]], dtype=np.float32)
+        cat_image = CatImage(image=rgb)
+
+        cat_image -= edges
+
+        self.assertIs(cat_image.image, rgb)
+        np.testing.assert_array_equal(rgb[0, :, 0], [100, 50, 0])
+        np.testing.assert_array_equal(rgb[1, :, 2], [99, 98, 97])
+
+        out = np.empty_like(rgb)
+        result = cat_image.add(CatImage(image=edges), out=out)
+        self.assertIs(result.image, out)
+        np.testing.assert_array_equal(out[0, :, 1], [100, 100, 255])
+        with self.assertRaises(ValueError):
+            cat_image.add(edges, out=np.empty((2, 3), dtype=np.uint8))
+        with self.assertRaises(TypeError):
+            cat_image + 1
+
+    def test_lazy_decode(self):
+        """Байты декодируются при первом обращении, форма читается из заголовка"""
+        pixels = np.random.default_rng(4).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+        buffer = BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        cat_image = CatImage.from_bytes(buffer.getvalue(), url="a.png", index=1)
+
+        self.assertFalse(cat_image.is_decoded)
+        self.assertEqual(cat_image.shape, (30, 40, 3))
+        self.assertFalse(cat_image.is_decoded)
+
+        restored = pickle.loads(pickle.dumps(cat_image))
+        self.assertFalse(restored.is_decoded)
+        np.testing.assert_array_equal(restored.image, pixels)
+
+        np.testing.assert_array_equal(cat_image.image, pixels)
+        cat_image.release()
+        self.assertFalse(cat_image.is_decoded)
+        self.assertIn("(30, 40, 3)", str(cat_image))
+
+    def test_inplace_on_decoded_image(self):
+        """Вычитание на месте работает для декодированного (только для чтения) изображения"""
+        pixels = np.random.default_rng(6).integers(0, 256, (20, 24, 3), dtype=np.uint8)
+        buffer = BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        cat_image = CatImage.from_bytes(buffer.getvalue())
+        self.assertFalse(cat_image.image.flags.writeable)
+        edges = ImageProcessing().edge_detection(cat_image.image)
+
+        cat_image -= edges
+
+        expected = np.clip(pixels - edges[..., None].astype(np.int64), 0, 255)
+        np.testing.assert_array_equal(cat_image.image, expected)
+        self.assertIsNone(cat_image.source)
+
+    def test_set_image_then_release(self):
+        """Присвоенные пиксели не подменяются оригиналом после release()"""
+        buffer = BytesIO()
+        Image.fromarray(np.zeros((10, 12, 3), dtype=np.uint8)).save(buffer, format="PNG")
+        cat_image = CatImage.from_bytes(buffer.getvalue())
+        replaced = np.full((10, 12, 3), 7, dtype=np.uint8)
+
+        cat_image.image = replaced
+        cat_image.release()
+
+        self.assertIs(cat_image.image, replaced)
+        self.assertIsNone(cat_image.source)
+        in_memory = CatImage(image=replaced)
+        in_memory.release()
+        self.assertIs(in_memory.image, replaced)
+
+    def test_lazy_path_target_size(self):
+        """Форма по заголовку с target_size совпадает с формой декодированного JPEG"""
+        pixels = np.random.default_rng(5).integers(0, 256, (123, 457, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cat.jpg"
+            Image.fromarray(pixels).save(path, format="JPEG")
+            for target_size in ((100, 100), (50, 40), (1000, 1000)):
+                cat_image = CatImage.from_path(path, target_size=target_size)
+                shape = cat_image.shape
+                self.assertEqual(cat_image.image.shape, shape)
+
     def test_convolution(self):
         """Тест свертки"""
         processor = ImageProcessing()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+from implementation import cat_pipeline
+from implementation.cat_image import CatImage
+
+
+class FakeCatAPIClient:
+    def __init__(self, *args, **kwargs):
+        self.download_stats = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def fetch_cats_urls(self, limit: int):
+        return [{"url": f"cat_{i}.jpg"} for i in range(limit)]
+
+    async def download_image(self, url: str, index: int) -> CatImage:
+        if index == 2:
+            raise ConnectionError("broken url")
+        image = np.random.default_rng(index).integers(0, 256, (10, 10, 3), dtype=np.uint8)
+        return CatImage(image=image, url=url, index=index)
+
+
+class TestStreamingPipeline(unittest.TestCase):
+    def test_pipeline_streams_all_images(self):
+        """Конвейер сохраняет исходные и обработанные изображения, пропуская ошибки загрузки"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with (
+                patch.object(cat_pipeline, "CatAPIClient", FakeCatAPIClient),
+                patch.object(cat_pipeline, "DATA_DIR", Path(tmp)),
+            ):
+                asyncio.run(
+                    cat_pipeline.run_pipeline_async(
+                        limit=4, download_workers=2, process_workers=2, queue_size=1
+                    )
+                )
+
+            saved = sorted(path.name for path in Path(tmp).iterdir())
+
+        self.assertEqual(
+            saved,
+            [f"{i}_{kind}.png" for i in (1, 3, 4) for kind in ("original", "processed")],
+        )
+
+    def test_pipeline_save_format(self):
+        """Формат сохранения задаётся параметром конвейера, метрики стадий экспортируются"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with (
+                patch.object(cat_pipeline, "CatAPIClient", FakeCatAPIClient),
+                patch.object(cat_pipeline, "DATA_DIR", Path(tmp)),
+            ):
+                asyncio.run(
+                    cat_pipeline.run_pipeline_async(
+                        limit=2,
+                        save_format="npy",
+                        enhance=True,
+                        metrics_path=Path(tmp) / "metrics.json",
+                    )
+                )
+                metrics = json.loads((Path(tmp) / "metrics.json").read_text(encoding="utf-8"))
+
+            original = np.load(Path(tmp) / "1_original.npy")
+            processed = np.load(Path(tmp) / "1_processed.npy")
+            enhanced = np.load(Path(tmp) / "1_enhanced.npy")
+
+        expected = np.random.default_rng(1).integers(0, 256, (10, 10, 3), dtype=np.uint8)
+        np.testing.assert_array_equal(original, expected)
+        self.assertTrue({"fetch", "process", "encode", "save"} <= set(metrics["stages"]))
+        self.assertEqual(metrics["stages"]["process"]["count"], 1)
+        self.assertGreaterEqual(metrics["counters"]["images_failed"], 1)
+        np.testing.assert_array_equal(
+            enhanced, np.clip(expected - processed[..., None].astype(np.int64), 0, 255)
+        )
+
+
+class TestSaveImage(unittest.TestCase):
+    def test_formats_round_trip(self):
+        """PNG и .npy сохраняются без потерь, WebP читается обратно, буферный режим совпадает"""
+        image = np.random.default_rng(3).integers(0, 256, (12, 16, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(2) as executor:
+            for image_format, direct in (("png", True), ("png", False), ("npy", True)):
+                path = Path(tmp) / f"{direct}.{image_format}"
+                asyncio.run(
+                    cat_pipeline.save_image_async(
+                        image, path, image_format, compression=1, executor=executor, direct=direct
+                    )
+                )
+                loaded = np.load(path) if image_format == "npy" else np.asarray(Image.open(path))
+                np.testing.assert_array_equal(loaded, image)
+
+            path = Path(tmp) / "cat.webp"
+            asyncio.run(cat_pipeline.save_image_async(image, path, "webp", compression=90))
+            self.assertEqual(Image.open(path).size, (16, 12))
+
+            with self.assertRaises(ValueError):
+                asyncio.run(cat_pipeline.save_image_async(image, path, "bmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
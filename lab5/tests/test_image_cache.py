@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from implementation.image_cache import ImageCache
+
+
+class TestImageCache(unittest.TestCase):
+    def test_store_and_load(self):
+        """Пиксели читаются из кэша через memmap, индекс переживает пересоздание"""
+        image = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp)
+            cache.store("a.jpg", b"content", image, {"ETag": '"v1"'})
+
+            reopened = ImageCache(tmp)
+            entry = reopened.lookup("a.jpg")
+            loaded = reopened.load("a.jpg")
+
+            self.assertEqual(ImageCache.validators(entry), {"If-None-Match": '"v1"'})
+            self.assertIsInstance(loaded, np.memmap)
+            np.testing.assert_array_equal(loaded, image)
+            self.assertIsNone(reopened.lookup("a.jpg", target_size=(10, 10)))
+
+    def test_target_size_separate_files(self):
+        """Одинаковое содержимое с разным target_size хранится в разных файлах"""
+        full = np.zeros((30, 40, 3), dtype=np.uint8)
+        reduced = np.ones((15, 20, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp)
+            cache.store("full.jpg", b"same", full)
+            cache.store("small.jpg", b"same", reduced, target_size=(20, 15))
+
+            self.assertIsNotNone(cache.lookup("small.jpg", (20, 15)))
+            np.testing.assert_array_equal(cache.load("small.jpg", (20, 15)), reduced)
+            self.assertIsNone(cache.load("small.jpg"))
+            np.testing.assert_array_equal(cache.load("full.jpg"), full)
+
+    def test_missing_file_is_miss(self):
+        """Пропавший или повреждённый файл записи - промах, а не исключение"""
+        image = np.zeros((4, 4, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp)
+            cache.store("a.jpg", b"a", image)
+            cache.store("b.jpg", b"b", image)
+            cache._path(cache.lookup("a.jpg")["digest"]).unlink()
+            cache._path(cache.lookup("b.jpg")["digest"]).write_bytes(b"broken")
+
+            self.assertIsNone(cache.load("a.jpg"))
+            self.assertIsNone(cache.load("b.jpg"))
+            self.assertIsNone(cache.lookup("b.jpg"))
+            self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+    def test_lru_eviction(self):
+        """Вытесняется давно не использованный адрес, общий файл содержимого остаётся"""
+        image = np.zeros((32, 32, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ImageCache(tmp)
+            cache.store("a.jpg", b"a", image)
+            cache.store("b.jpg", b"b", image)
+            cache.store("b-mirror.jpg", b"b", image)
+            cache.max_bytes = cache.size_bytes
+            cache.load("a.jpg")
+
+            cache.store("c.jpg", b"c", image)
+
+            self.assertIsNotNone(cache.lookup("a.jpg"))
+            self.assertIsNone(cache.lookup("b.jpg"))
+            self.assertIsNone(cache.lookup("b-mirror.jpg"))
+            self.assertIsNotNone(cache.lookup("c.jpg"))
+            self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
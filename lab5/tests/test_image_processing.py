@@ -1,9 +1,17 @@
+import asyncio
+import time
+import tracemalloc
 import unittest
+from multiprocessing import shared_memory
+from unittest.mock import patch
 
 import numpy as np
 
+from implementation.backends import registry
 from implementation.cat_image import CatImage
 from implementation.cat_image_processor import CatImageProcessor
+from implementation.image_processing import ImageProcessing
+from implementation.shared_image_buffer import SharedImageBuffer
 
 
 class TestCatImageProcessor(unittest.TestCase):
@@ -21,6 +29,315 @@ class TestCatImageProcessor(unittest.TestCase):
         self.assertIsInstance(result, CatImage)
         self.assertEqual(len(result.image.shape), 2)
 
+    def test_edge_detection_batch(self):
+        """Пакетная обработка совпадает с поизображенческой"""
+        processor = CatImageProcessor()
+        rng = np.random.default_rng(1)
+        images = [
+            rng.integers(0, 256, (8, 8, 3), dtype=np.uint8),
+            rng.integers(0, 256, (6, 10, 3), dtype=np.uint8),
+            rng.integers(0, 256, (8, 8, 3), dtype=np.uint8),
+        ]
+        cat_images = [CatImage(image=image, index=i) for i, image in enumerate(images)]
+
+        results = processor.edge_detection_cat_batch(cat_images)
+
+        self.assertEqual([result.index for result in results], [0, 1, 2])
+        for image, result in zip(images, results):
+            np.testing.assert_allclose(result.image, processor.edge_detection(image), rtol=1e-5)
+
+        stacked = processor.edge_detection_batch(np.stack([images[0], images[2]]))
+        self.assertEqual(stacked.shape, (2, 8, 8))
+        with self.assertRaises(ValueError):
+            processor.edge_detection_batch(images, out=np.empty((3, 8, 8), dtype=np.float32))
+
+    def test_backend_reaches_workers(self):
+        """Бэкенд обработчика используется на месте, в потоках и в рабочих процессах"""
+        image = np.random.default_rng(2).integers(0, 256, (20, 24, 3), dtype=np.uint8)
+        expected = ImageProcessing().apply("edges", image, backend="scipy")
+        self.assertFalse(np.array_equal(expected, ImageProcessing().edge_detection(image)))
+
+        async def run(executor):
+            async with CatImageProcessor(
+                max_workers=1, executor=executor, backend="scipy"
+            ) as processor:
+                return await processor.process_images_parallel([CatImage(image=image)])
+
+        for executor in ("inline", "threads", "processes"):
+            (result,) = asyncio.run(run(executor))
+            np.testing.assert_array_equal(result.image, expected, err_msg=executor)
+
+    def test_process_images_shared_memory(self):
+        """Обработка через разделяемую память совпадает с обычной и освобождает сегменты"""
+        processor = CatImageProcessor()
+        rng = np.random.default_rng(3)
+        cat_images = [
+            CatImage(image=rng.integers(0, 256, (12, 9, 3), dtype=np.uint8), url="u", index=i)
+            for i in range(3)
+        ]
+
+        async def run():
+            async with processor:
+                return await processor.process_images_parallel(cat_images, shared_memory=True)
+
+        results = asyncio.run(run())
+
+        self.assertEqual([result.index for result in results], [0, 1, 2])
+        for cat_image, result in zip(cat_images, results):
+            np.testing.assert_allclose(result.image, processor.edge_detection(cat_image.image))
+
+    def test_process_pool_is_reused(self):
+        """Пул процессов живёт между вызовами и останавливается при выходе из контекста"""
+        processor = CatImageProcessor(max_workers=2, executor="processes")
+        cat_images = [CatImage(image=np.eye(6, dtype=np.uint8)[..., None].repeat(3, axis=2))]
+
+        async def run():
+            async with processor:
+                await processor.process_images_parallel(cat_images)
+                executor = processor._executor
+                await processor.process_images_parallel(cat_images)
+                self.assertIs(processor._executor, executor)
+
+        asyncio.run(run())
+        self.assertIsNone(processor._executor)
+
+    def test_executor_strategies(self):
+        """Потоки, процессы и выполнение на месте дают одинаковый результат"""
+        rng = np.random.default_rng(9)
+        cat_images = [
+            CatImage(image=rng.integers(0, 256, (10, 14, 3), dtype=np.uint8), index=i)
+            for i in range(3)
+        ]
+        expected = CatImageProcessor().edge_detection(cat_images[1].image)
+
+        async def run(strategy):
+            async with CatImageProcessor(max_workers=2, executor=strategy) as processor:
+                return await processor.process_images_parallel(cat_images)
+
+        for strategy in ("inline", "threads", "processes"):
+            results = asyncio.run(run(strategy))
+            self.assertEqual([result.index for result in results], [0, 1, 2])
+            np.testing.assert_allclose(results[1].image, expected, rtol=1e-5)
+
+        with self.assertRaises(ValueError):
+            CatImageProcessor(executor="gpu")
+
+    def test_adaptive_strategy(self):
+        """Маленький пакет выполняется на месте, большие изображения и одно ядро - потоками"""
+        processor = CatImageProcessor()
+        small = [CatImage(image=np.zeros((8, 8, 3), dtype=np.uint8))]
+        large = [CatImage(image=np.zeros((512, 512, 3), dtype=np.uint8))] * 2
+        medium = [CatImage(image=np.zeros((128, 128, 3), dtype=np.uint8))] * 8
+
+        self.assertEqual(processor.choose_strategy(small), "inline")
+        with patch("os.cpu_count", return_value=8):
+            self.assertEqual(processor.choose_strategy(large), "threads")
+            self.assertEqual(processor.choose_strategy(medium), "processes")
+        with patch("os.cpu_count", return_value=1):
+            self.assertEqual(processor.choose_strategy(large), "threads")
+            self.assertEqual(processor.choose_strategy(medium), "threads")
+            self.assertEqual(processor.choose_strategy(small), "inline")
+
+    def test_shared_buffer_unlinked(self):
+        """Сегмент удаляется при выходе из контекста владельца"""
+        with SharedImageBuffer.from_array(np.arange(6).reshape(2, 3)) as buffer:
+            name = buffer.name
+            with SharedImageBuffer.attach(*buffer.spec) as attached:
+                np.testing.assert_array_equal(attached.array, np.arange(6).reshape(2, 3))
+
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+class TestConvolutionMethods(unittest.TestCase):
+    def test_methods_match_direct(self):
+        """Все стратегии свёртки совпадают с исходной реализацией"""
+        processor = ImageProcessing()
+        rng = np.random.default_rng(0)
+        image = rng.random((31, 27), dtype=np.float32) * 255
+        kernels = [
+            np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype=np.float32),
+            rng.random((5, 5), dtype=np.float32),
+            rng.random((13, 11), dtype=np.float32),
+        ]
+
+        for kernel in kernels:
+            expected = processor._convolution2d(image, kernel, method="direct")
+            for method in ("auto", "shifted", "fft"):
+                result = processor._convolution2d(image, kernel, method=method)
+                np.testing.assert_allclose(result, expected, rtol=1e-4, atol=1e-2)
+
+        sobel = kernels[0]
+        np.testing.assert_allclose(
+            processor._convolution2d(image, sobel, method="separable"),
+            processor._convolution2d(image, sobel, method="direct"),
+            rtol=1e-4,
+            atol=1e-2,
+        )
+
+    def test_auto_method_choice(self):
+        """Выбор стратегии по ядру"""
+        processor = ImageProcessing()
+        self.assertEqual(
+            processor._choose_convolution_method(np.outer([1, 2, 1], [-1, 0, 1])), "separable"
+        )
+        self.assertEqual(processor._choose_convolution_method(np.eye(3)), "shifted")
+        self.assertEqual(processor._choose_convolution_method(np.eye(15)), "fft")
+
+    def test_fused_sobel_matches_convolution(self):
+        """Слитый проход Собеля совпадает с двумя свёртками и пишет в out"""
+        processor = ImageProcessing()
+        rng = np.random.default_rng(2)
+        image = rng.integers(0, 256, (17, 23, 3), dtype=np.uint8)
+        gray = processor._rgb_to_grayscale(image)
+
+        sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype=np.float32)
+        grad_x = processor._convolution2d(gray, sobel_x, method="direct")
+        grad_y = processor._convolution2d(gray, sobel_x.T, method="direct")
+        magnitude = np.sqrt(grad_x**2 + grad_y**2)
+        expected = magnitude * 255 / magnitude.max()
+
+        out = np.empty((17, 23), dtype=np.float32)
+        result = processor.edge_detection(image, out=out)
+
+        self.assertIs(result, out)
+        np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-3)
+
+        with self.assertRaises(ValueError):
+            processor.edge_detection(image, out=np.empty((17, 23), dtype=np.float64))
+
+    def test_grayscale_without_float64_temporary(self):
+        """Перевод в оттенки серого совпадает с np.dot и не создаёт временный кадр float64"""
+        processor = ImageProcessing()
+        image = np.random.default_rng(10).integers(0, 256, (600, 500, 3), dtype=np.uint8)
+        expected = np.dot(image, [0.299, 0.587, 0.114])
+
+        tracemalloc.start()
+        gray = processor._rgb_to_grayscale(image)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertEqual(gray.dtype, np.float32)
+        np.testing.assert_allclose(gray, expected, rtol=1e-6, atol=1e-4)
+        self.assertLess(peak, gray.nbytes * 2)
+        np.testing.assert_allclose(
+            processor._rgb_to_grayscale(np.stack([image, image]))[1], gray, rtol=0
+        )
+
+    def test_tiled_matches_untiled(self):
+        """Обработка по плиткам побитово совпадает с обработкой целого кадра"""
+        processor = ImageProcessing()
+        image = np.random.default_rng(5).integers(0, 256, (53, 71, 3), dtype=np.uint8)
+
+        for tile_size, workers in ((16, 1), (20, 3)):
+            np.testing.assert_array_equal(
+                processor.edge_detection_tiled(image, tile_size=tile_size, workers=workers),
+                processor.edge_detection(image),
+            )
+            np.testing.assert_array_equal(
+                processor.corner_detection_tiled(image, tile_size=tile_size, workers=workers),
+                processor.corner_detection(image),
+            )
+
+    def test_detect_circles(self):
+        """Окружности находятся с точностью до пикселя, на шуме - нет"""
+        processor = ImageProcessing()
+        yy, xx = np.mgrid[:160, :200]
+        image = np.full((160, 200, 3), 30, dtype=np.uint8)
+        expected = [(60, 70, 30), (150, 100, 20)]
+        for x, y, r in expected:
+            image[(xx - x) ** 2 + (yy - y) ** 2 <= r * r] = 200
+
+        circles = processor.detect_circles(image, min_radius=10, max_radius=50)
+
+        self.assertEqual(circles.shape, (2, 4))
+        for x, y, r in expected:
+            distances = np.abs(circles[:, :3] - (x, y, r)).max(axis=1)
+            self.assertLessEqual(distances.min(), 1)
+        self.assertTrue((processor.circle_detection(image) != image).any())
+
+        noise = np.random.default_rng(6).integers(0, 256, (100, 120, 3), dtype=np.uint8)
+        self.assertEqual(len(processor.detect_circles(noise)), 0)
+
+        # тонкие кольца без ложных малых окружностей при параметрах по умолчанию
+        yy, xx = np.mgrid[:180, :240]
+        rings = np.full((180, 240, 3), 40, dtype=np.uint8)
+        for x, y, r in ((60, 90, 25), (160, 90, 60)):
+            rings[np.abs(np.hypot(xx - x, yy - y) - r) <= 1] = 220
+        found = processor.detect_circles(rings)
+        self.assertEqual(len(found), 2, found)
+        self.assertTrue((np.abs(np.sort(found[:, 2]) - (25, 60)) <= 2).all())
+
+    def test_detect_circles_time(self):
+        """Голосование проходит весь аккумулятор раз на пачку радиусов, а не на каждый радиус"""
+        processor = ImageProcessing()
+        yy, xx = np.mgrid[:480, :640]
+        image = np.full((480, 640, 3), 40, dtype=np.uint8)
+        image[(xx - 320) ** 2 + (yy - 240) ** 2 <= 120**2] = 190
+        processor.detect_circles(image)
+
+        started = time.perf_counter()
+        with patch("numpy.bincount", wraps=np.bincount) as bincount:
+            circles = processor.detect_circles(image)
+        elapsed = time.perf_counter() - started
+
+        full_frame = [
+            call for call in bincount.call_args_list if call.kwargs["minlength"] >= 480 * 640
+        ]
+        self.assertLessEqual(len(full_frame), 4)
+        self.assertLessEqual(np.abs(circles[0, :3] - (320, 240, 120)).max(), 1)
+        self.assertLess(elapsed, 0.5)
+
+    def test_backends_interchangeable(self):
+        """Реализации операций разных бэкендов дают одинаковый результат"""
+        processor = ImageProcessing()
+        image = np.random.default_rng(7).integers(0, 256, (40, 52, 3), dtype=np.uint8)
+
+        expected = processor.apply("edges", image, backend="numpy")
+        for backend in registry.available("edges"):
+            np.testing.assert_allclose(
+                processor.apply("edges", image, backend=backend), expected, atol=1e-3
+            )
+
+        corners = processor.apply("corners", image, backend="scipy")
+        for backend in registry.available("corners"):
+            result = processor.apply("corners", image, backend=backend)
+            self.assertGreater((result == corners).all(axis=-1).mean(), 0.99)
+
+        # толстые кольца: OpenCV даёт много сдвинутых кандидатов, остаться должны только сами кольца
+        yy, xx = np.mgrid[:200, :260]
+        rings = np.full((200, 260, 3), 40, dtype=np.uint8)
+        for x, y, r in ((70, 80, 40), (180, 110, 55)):
+            rings[np.abs(np.hypot(xx - x, yy - y) - r) <= 3] = 220
+        expected = processor.apply("circles", rings, backend="numpy", max_radius=80)
+        self.assertEqual(len(expected), 2)
+        for backend in registry.available("circles"):
+            circles = processor.apply("circles", rings, backend=backend, max_radius=80)
+            self.assertEqual(len(circles), 2, (backend, circles))
+            self.assertLessEqual(np.abs(circles[:, :3] - expected[:, :3]).max(), 2)
+
+        self.assertEqual(processor.apply("edges", image).dtype, np.float32)
+        self.assertIn(("edges", registry.size_bucket(image)), registry.choices())
+
+    def test_backend_fallback(self):
+        """Без OpenCV используется доступная реализация"""
+        processor = ImageProcessing(backend="opencv")
+        image = np.random.default_rng(8).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+
+        with patch("implementation.backends._has_module", return_value=False):
+            self.assertNotIn("opencv", registry.available("edges"))
+            with self.assertWarns(RuntimeWarning):
+                result = processor.apply("edges", image)
+
+        np.testing.assert_array_equal(result, processor.edge_detection(image))
+        with self.assertRaises(ValueError):
+            ImageProcessing(backend="cuda")
+
+    def test_unknown_method(self):
+        """Неизвестная стратегия отклоняется"""
+        with self.assertRaises(ValueError):
+            ImageProcessing(convolution_method="winograd")
+
 
 if __name__ == "__main__":
     unittest.main()
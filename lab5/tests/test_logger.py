@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import tempfile
+import unittest
+from logging.handlers import QueueHandler
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from implementation.cat_image import CatImage
+from implementation.cat_image_processor import CatImageProcessor
+from implementation.logger import (
+    LOGGER_NAME,
+    PipelineLogger,
+    configure_logging,
+    stop_logging,
+    timeit,
+)
+from implementation.metrics import MetricsRegistry
+
+
+class TestTimeit(unittest.TestCase):
+    def test_function_kinds(self):
+        """Обычные, асинхронные и генераторные функции остаются собой и замеряются"""
+        metrics = MetricsRegistry()
+
+        @timeit(metrics=metrics)
+        def square(x):
+            return x * x
+
+        @timeit(metrics=metrics, name="coroutine")
+        async def double(x):
+            await asyncio.sleep(0)
+            return 2 * x
+
+        @timeit(metrics=metrics)
+        def numbers(n):
+            yield from range(n)
+
+        @timeit(metrics=metrics)
+        async def async_numbers(n):
+            for i in range(n):
+                yield i
+
+        async def collect():
+            return [i async for i in async_numbers(3)]
+
+        self.assertEqual(square(3), 9)
+        self.assertEqual(asyncio.run(double(4)), 8)
+        self.assertEqual(list(numbers(3)), [0, 1, 2])
+        self.assertEqual(asyncio.run(collect()), [0, 1, 2])
+        self.assertEqual(square.__name__, "square")
+
+        stages = metrics.snapshot()["stages"]
+        self.assertEqual(stages[square.__qualname__]["count"], 1)
+        self.assertEqual(stages["coroutine"]["count"], 1)
+        self.assertEqual(stages[numbers.__qualname__]["count"], 1)
+        self.assertEqual(stages[async_numbers.__qualname__]["count"], 1)
+
+    def test_sampling(self):
+        """Замеряется только доля вызовов sample_rate"""
+        metrics = MetricsRegistry()
+        never = timeit(lambda: 1, name="never", sample_rate=0, metrics=metrics)
+        half = timeit(lambda: 1, name="half", sample_rate=0.5, metrics=metrics)
+
+        with patch("random.random", side_effect=[0.1, 0.9] * 50):
+            for _ in range(100):
+                never()
+                half()
+
+        self.assertEqual(metrics.histogram("never").count, 0)
+        self.assertEqual(metrics.histogram("half").count, 50)
+
+    def test_pipeline_logger_log(self):
+        """С log=True начало и конец вызова пишутся в лог"""
+        pipeline_logger = PipelineLogger(metrics=MetricsRegistry())
+
+        @pipeline_logger.timeit(log=True)
+        def work():
+            return 42
+
+        with self.assertLogs("pipeline_logger", level="INFO") as logs:
+            self.assertEqual(work(), 42)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(pipeline_logger.metrics.histogram(work.__qualname__).count, 1)
+
+
+class TestQueueLogging(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_file = Path(self.tmp.name) / "app.log"
+        stop_logging()
+
+    def tearDown(self):
+        stop_logging()
+        self.tmp.cleanup()
+
+    def test_configured_once(self):
+        """Повторное создание PipelineLogger не пересоздаёт обработчики"""
+        first = PipelineLogger(log_file=str(self.log_file))
+        handlers = list(first.logger.handlers)
+        second = PipelineLogger(log_file=str(Path(self.tmp.name) / "other.log"))
+
+        self.assertEqual(second.logger.handlers, handlers)
+        self.assertEqual(len(handlers), 1)
+        self.assertIsInstance(handlers[0], QueueHandler)
+
+    def test_rotating_file(self):
+        """Записи пишутся фоновым потоком в файлы ограниченного размера"""
+        logger = configure_logging(str(self.log_file), max_bytes=500, backup_count=2)
+        for i in range(50):
+            logger.debug(f"message {i:03d}")
+        stop_logging()
+
+        files = sorted(path.name for path in Path(self.tmp.name).iterdir())
+        self.assertEqual(files, ["app.log", "app.log.1", "app.log.2"])
+        self.assertLessEqual(self.log_file.stat().st_size, 500)
+        self.assertIn("message 049", self.log_file.read_text(encoding="utf-8"))
+
+    def test_worker_processes_log(self):
+        """Записи рабочих процессов пула попадают в файл родителя"""
+        configure_logging(str(self.log_file))
+        cat_images = [CatImage(image=np.zeros((8, 8, 3), dtype=np.uint8), index=7)]
+
+        async def run():
+            async with CatImageProcessor(max_workers=1, executor="processes") as processor:
+                await processor.process_images_parallel(cat_images)
+
+        asyncio.run(run())
+        stop_logging()
+
+        lines = self.log_file.read_text(encoding="utf-8").splitlines()
+        worker_lines = [
+            line
+            for line in lines
+            if "Convolution for image 7 finished" in line and f"(PID {os.getpid()})" not in line
+        ]
+        self.assertEqual(len(worker_lines), 1)
+        self.assertEqual(logging.getLogger(LOGGER_NAME).handlers, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
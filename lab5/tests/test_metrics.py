@@ -0,0 +1,87 @@
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+from implementation.metrics import LatencyHistogram, MetricsRegistry
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """Перцентили оцениваются с точностью до корзины и не выходят за min/max"""
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.observe(ms * 1_000_000)
+
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["sum_s"], 5.05)
+        self.assertLess(abs(summary["p50_s"] - 0.050), 0.015)
+        self.assertLess(abs(summary["p95_s"] - 0.095), 0.015)
+        self.assertLessEqual(summary["p99_s"], summary["max_s"])
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def make_registry(self) -> MetricsRegistry:
+        metrics = MetricsRegistry()
+        with metrics.stage("decode"):
+            pass
+        metrics.observe("download", 2_000_000)
+        metrics.count("bytes_downloaded", 1024)
+        metrics.count("images_failed")
+        return metrics
+
+    def test_json_export(self):
+        """JSON содержит стадии с перцентилями и счётчики"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "metrics.json"
+            self.make_registry().export(path)
+            data = json.loads(path.read_text(encoding="utf-8"))
+
+        self.assertEqual(set(data["stages"]), {"decode", "download"})
+        self.assertIn("p95_s", data["stages"]["download"])
+        self.assertEqual(data["counters"], {"bytes_downloaded": 1024, "images_failed": 1})
+
+    def test_prometheus_export(self):
+        """Текстовый формат Prometheus: кумулятивные корзины, сумма, счётчики; отправка по HTTP"""
+        received = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                received["body"] = self.rfile.read(length).decode()
+                received["type"] = self.headers["Content-Type"]
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            self.make_registry().export(f"http://127.0.0.1:{server.server_port}/", "prometheus")
+        finally:
+            thread.join()
+            server.server_close()
+
+        text = received["body"]
+        self.assertTrue(received["type"].startswith("text/plain"))
+        self.assertIn('pipeline_stage_duration_seconds_bucket{stage="download",le="+Inf"} 1', text)
+        self.assertIn(
+            'pipeline_stage_duration_seconds_bucket{stage="download",le="0.00256"} 1', text
+        )
+        self.assertIn(
+            'pipeline_stage_duration_seconds_bucket{stage="download",le="0.00128"} 0', text
+        )
+        self.assertIn("pipeline_bytes_downloaded_total 1024", text)
+        with self.assertRaises(ValueError):
+            self.make_registry().export("metrics.xml", "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
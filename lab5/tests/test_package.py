@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import implementation
+
+SRC_DIR = Path(implementation.__file__).resolve().parent.parent
+
+# Бюджет "import implementation" в микросекундах: заметно меньше, чем импорт одного NumPy
+IMPORT_BUDGET_US = 100_000
+
+HEAVY_MODULES = ("numpy", "scipy", "aiohttp", "PIL", "cv2")
+
+
+def import_times(statement: str) -> dict:
+    """Запускает statement под python -X importtime и возвращает {модуль: cumulative, мкс}."""
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_package_import_is_light(self):
+        """Импорт пакета не загружает тяжёлые зависимости и укладывается в бюджет"""
+        times = import_times("import implementation")
+
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+        self.assertLess(times["implementation"], IMPORT_BUDGET_US)
+
+    def test_attribute_loads_only_its_module(self):
+        """Обращение к атрибуту загружает только нужный подмодуль"""
+        times = import_times("from implementation import CatImageProcessor")
+
+        # сам подмодуль загружается через importlib и в отчёт не попадает, его зависимости - да
+        self.assertIn("implementation.image_processing", times)
+        for module in ("scipy", "aiohttp", "PIL", "implementation.cat_api_client"):
+            self.assertNotIn(module, times)
+
+    def test_lazy_attributes(self):
+        """Ленивые атрибуты совпадают с классами подмодулей"""
+        from implementation.cat_api_client import CatAPIClient
+
+        self.assertIs(implementation.CatAPIClient, CatAPIClient)
+        self.assertIn("CatImage", dir(implementation))
+        with self.assertRaises(AttributeError):
+            implementation.Missing
+
+
+if __name__ == "__main__":
+    unittest.main()
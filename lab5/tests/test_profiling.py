@@ -0,0 +1,105 @@
+import asyncio
+import json
+import pstats
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from implementation import profiling
+from implementation.cat_image import CatImage
+from implementation.cat_image_processor import CatImageProcessor
+
+
+def _busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def _busy_stage(stage: str, n: int) -> int:
+    with profiling.stage(stage):
+        return _busy(n)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stages(self):
+        """Стадии профилируются отдельно, вне профилирования stage ничего не делает"""
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = profiling.Profiler(tmp).start()
+            with profiling.stage("load"):
+                _busy(10_000)
+            # до Python 3.12 у стадий других потоков свои профили, с 3.12 - только время
+            thread = threading.Thread(target=_busy_stage, args=("decode", 10_000))
+            thread.start()
+            thread.join()
+            profiler.finish()
+
+            with profiling.stage("load"):
+                pass
+            names = sorted(path.name.split("-", 2)[2] for path in Path(tmp).glob("*.pstats"))
+            load = pstats.Stats(str(next(Path(tmp).glob("*-load.pstats"))))
+
+        expected = ["load.pstats", "main.pstats"]
+        if profiling.THREAD_PROFILES:
+            expected.insert(0, "decode.pstats")
+        self.assertEqual(names, expected)
+        self.assertTrue(any(func[2] == "_busy" for func in load.stats))
+        with self.assertRaises(ValueError):
+            profiling.Profiler(tmp, mode="perf")
+
+    def test_session_merges_workers(self):
+        """Профили рабочих процессов пула объединяются с профилем основного процесса"""
+        cat_images = [
+            CatImage(image=np.zeros((16, 16, 3), dtype=np.uint8), index=i) for i in range(2)
+        ]
+
+        async def run():
+            async with CatImageProcessor(max_workers=2, executor="processes") as processor:
+                await processor.process_images_parallel(cat_images)
+
+        for mode, suffix in (("cprofile", ".pstats"), ("sample", ".collapsed")):
+            with tempfile.TemporaryDirectory() as tmp:
+                prefix = Path(tmp) / "profile"
+                with profiling.session(mode, prefix, interval=0.001, trace_memory=True):
+                    asyncio.run(run())
+                    _busy(200_000)
+
+                self.assertTrue(prefix.with_suffix(suffix).exists())
+                self.assertFalse(prefix.with_suffix(".parts").exists())
+                if mode == "cprofile":
+                    process = pstats.Stats(str(prefix.with_suffix(".process.pstats")))
+                    self.assertTrue(any(func[2] == "edge_detection" for func in process.stats))
+                memory = json.loads(prefix.with_suffix(".memory.json").read_text(encoding="utf-8"))
+
+            self.assertIsNone(profiling.worker_config())
+            names = sorted(process["name"] for process in memory)
+            self.assertEqual(names[0], "main")
+            self.assertIn("worker", names)
+            self.assertTrue(all(process["peak_rss_kb"] > 0 for process in memory))
+            self.assertGreater(memory[0]["tracemalloc_peak_bytes"], 0)
+            self.assertTrue(any("process" in process["stage_seconds"] for process in memory))
+
+    def test_threads_strategy_profiled(self):
+        """Стадия process в потоках пула попадает в профиль cprofile"""
+        cat_images = [
+            CatImage(image=np.zeros((16, 16, 3), dtype=np.uint8), index=i) for i in range(2)
+        ]
+
+        async def run():
+            async with CatImageProcessor(max_workers=2, executor="threads") as processor:
+                await processor.process_images_parallel(cat_images)
+                return processor.choose_strategy(cat_images)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = Path(tmp) / "profile"
+            with profiling.session("cprofile", prefix):
+                strategy = asyncio.run(run())
+            process = pstats.Stats(str(prefix.with_suffix(".process.pstats")))
+
+        self.assertTrue(any(func[2] == "edge_detection" for func in process.stats))
+        self.assertEqual(strategy, "threads" if profiling.THREAD_PROFILES else "processes")
+
+
+if __name__ == "__main__":
+    unittest.main()
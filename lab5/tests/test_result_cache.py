@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from implementation.image_processing import ImageProcessing
+from implementation.result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.image = np.random.default_rng(4).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+
+    def test_memoized_methods(self):
+        """Повторный вызов берётся из кэша, параметры различают ключи"""
+        cache = ResultCache()
+        processor = ImageProcessing(result_cache=cache)
+
+        first = processor.edge_detection(self.image)
+        second = processor.edge_detection(self.image.copy())
+
+        self.assertIs(first, second)
+        self.assertFalse(second.flags.writeable)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        processor.corner_detection(self.image, k=0.04)
+        processor.corner_detection(self.image, 0.05)
+        processor.corner_detection(self.image, threshold=0.01, k=0.04)
+        processor.corner_detection(self.image, threshold=np.float64(0.01), k=np.float64(0.04))
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+
+    def test_out_bypasses_cache(self):
+        """Вызов с out, в том числе позиционным, пишет в буфер вызывающего и не кэшируется"""
+        cache = ResultCache()
+        processor = ImageProcessing(result_cache=cache)
+
+        for _ in range(2):
+            out = np.zeros(self.image.shape[:2], dtype=np.float32)
+            result = processor.edge_detection(self.image, out)
+            self.assertIs(result, out)
+            self.assertTrue(out.flags.writeable)
+            self.assertGreater(out.max(), 0)
+
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_byte_budget_and_disk_tier(self):
+        """LRU укладывается в бюджет, вытесненное читается с диска"""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(max_bytes=16 * 16 * 4, disk_dir=tmp)
+            processor = ImageProcessing(result_cache=cache)
+
+            first = processor.edge_detection(self.image)
+            processor.edge_detection(self.image[::-1])
+            self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+
+            again = processor.edge_detection(self.image)
+
+            self.assertEqual(cache.disk_hits, 1)
+            np.testing.assert_array_equal(again, first)
+            self.assertFalse(again.flags.writeable)
+
+    def test_disk_tier_budget(self):
+        """Дисковый уровень вытесняет давно не использованные файлы, в том числе старые"""
+        images = [self.image[::-1], self.image[:, ::-1], self.image[::-1, ::-1]]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(max_bytes=0, disk_dir=tmp)
+            processor = ImageProcessing(result_cache=cache)
+            processor.edge_detection(self.image)
+            file_bytes = cache.disk_size_bytes
+
+            reopened = ResultCache(max_bytes=0, disk_dir=tmp, max_disk_bytes=2 * file_bytes)
+            processor = ImageProcessing(result_cache=reopened)
+            for image in images:
+                processor.edge_detection(image)
+            processor.edge_detection(images[1])
+
+            self.assertEqual(len(list(Path(tmp).glob("*.npy"))), 2)
+            self.assertEqual(reopened.disk_size_bytes, 2 * file_bytes)
+            self.assertEqual(reopened.disk_hits, 1)
+            processor.edge_detection(self.image)
+            self.assertEqual(reopened.disk_hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()